@@ -11,15 +11,24 @@ Export tous les films Radarr avec :
 - nom du fichier .mkv
 - hash du torrent qBittorrent correspondant (si trouvé)
 
-Résultat : JSON
+Résultat : JSON (ou JSONL, un film par ligne, si OUTPUT_JSONL = True)
 """
 
 from __future__ import annotations
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    # décodage JSON plus rapide si orjson est installé (optionnel)
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
 
 # ============================================================
 # ========================= CONFIG ===========================
@@ -31,21 +40,37 @@ RADARR_APIKEY = "PUT_RADARR_API_KEY_HERE"
 QBT_HOST = "http://127.0.0.1:8080"
 QBT_USER = "admin"
 QBT_PASS = "adminadmin"
+# Si renseigné (ex: "/downloads/movies"), seuls les torrents dont le save_path est
+# sous ce dossier sont inspectés lors du fallback (ignore les séries, etc.)
+QBT_MOVIES_ROOT = ""
 
 OUTPUT_JSON = Path("radarr_movies_export.json")
+# Cache des listes de fichiers : hash -> {completion_on, basenames}
+FILES_CACHE_JSON = Path("qb_files_cache.json")
+JSON_INDENT = None   # 2 pour un export lisible (plus lent et plus gros)
+OUTPUT_JSONL = False # True : un film par ligne dans radarr_movies_export.jsonl (écrit au fil de l'eau)
 
 REQUEST_TIMEOUT = 15.0
+QB_FILES_WORKERS = 8   # requêtes /torrents/files en parallèle
 VERBOSE = True
 
 # ============================================================
 # ======================= RADARR API =========================
 # ============================================================
 
-def radarr_get_movies() -> List[Dict[str, Any]]:
+def make_session(pool_size: int = 1) -> requests.Session:
+    # keep-alive : connexions réutilisées (pool_size >= nombre de workers)
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+def radarr_get_movies(session: requests.Session) -> List[Dict[str, Any]]:
     url = RADARR_HOST.rstrip("/") + "/api/v3/movie"
-    r = requests.get(url, params={"apikey": RADARR_APIKEY}, timeout=REQUEST_TIMEOUT)
+    r = session.get(url, timeout=REQUEST_TIMEOUT)
     r.raise_for_status()
-    return r.json()
+    return json_loads(r.content)
 
 # ============================================================
 # ===================== QBITTORRENT API ======================
@@ -62,13 +87,13 @@ def qb_get_torrents(session: requests.Session) -> List[Dict[str, Any]]:
     url = QBT_HOST.rstrip("/") + "/api/v2/torrents/info"
     r = session.get(url, timeout=REQUEST_TIMEOUT)
     r.raise_for_status()
-    return r.json()
+    return json_loads(r.content)
 
 def qb_get_torrent_files(session: requests.Session, hash_: str) -> List[Dict[str, Any]]:
     url = QBT_HOST.rstrip("/") + "/api/v2/torrents/files"
     r = session.get(url, params={"hash": hash_}, timeout=REQUEST_TIMEOUT)
     r.raise_for_status()
-    return r.json()
+    return json_loads(r.content)
 
 # ============================================================
 # ========================= HELPERS ==========================
@@ -77,95 +102,188 @@ def qb_get_torrent_files(session: requests.Session, hash_: str) -> List[Dict[str
 def normalize(p: Optional[str]) -> Optional[str]:
     return str(Path(p)) if p else None
 
-def get_parent(p: Optional[str]) -> Optional[str]:
-    return str(Path(p).parent) if p else None
-
-def extract_mkv(moviefile_path: Optional[str]) -> Optional[str]:
-    if not moviefile_path:
-        return None
-    p = Path(moviefile_path)
-    if p.suffix.lower() == ".mkv":
-        return p.name
-    return None
+def split_moviefile(p: Optional[str]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """(chemin normalisé, dossier parent, nom du .mkv ou None) avec un seul Path."""
+    if not p:
+        return None, None, None
+    path = Path(p)
+    mkv_name = path.name if path.suffix.lower() == ".mkv" else None
+    return str(path), str(path.parent), mkv_name
+
+def file_basename_lower(name: Optional[str]) -> str:
+    # nom de fichier après le dernier "/" : simple découpe, sans split() ni liste
+    name = name or ""
+    return name[name.rfind("/") + 1:].lower()
+
+def under_root(p: Optional[str], root: str) -> bool:
+    if not p:
+        return False
+    return p == root or p.startswith(os.path.join(root, ""))
+
+def load_files_cache(p: Path) -> Dict[str, Dict[str, Any]]:
+    try:
+        data = json.loads(p.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def save_files_cache(p: Path, cache: Dict[str, Dict[str, Any]]):
+    tmp = p.with_name(p.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    tmp.replace(p)
+
+def build_files_index(session: requests.Session, torrents: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Index nom de fichier (minuscule) -> hash, en un seul passage sur les torrents.
+
+    Les noms de fichiers sont mis en cache sur disque par (hash, completion_on) :
+    seuls les torrents nouveaux ou modifiés sont interrogés.
+    """
+    cache = load_files_cache(FILES_CACHE_JSON)
+    dirty = False
+
+    def fetch(t: Dict[str, Any]):
+        h = t.get("hash")
+        try:
+            files = qb_get_torrent_files(session, h)
+        except Exception:
+            return h, None
+        return h, [file_basename_lower(f.get("name")) for f in files]
+
+    basenames_by_hash: Dict[str, List[str]] = {}
+    to_fetch = []
+    for t in torrents:
+        h = t.get("hash")
+        cached = cache.get(h)
+        if cached and cached.get("completion_on") == t.get("completion_on"):
+            basenames_by_hash[h] = cached.get("basenames") or []
+        else:
+            to_fetch.append(t)
+
+    # map() conserve l'ordre des torrents : les listes sont récupérées en parallèle
+    if to_fetch:
+        with ThreadPoolExecutor(max_workers=QB_FILES_WORKERS) as ex:
+            for t, (h, basenames) in zip(to_fetch, ex.map(fetch, to_fetch)):
+                if basenames is None:
+                    continue
+                basenames_by_hash[h] = basenames
+                cache[h] = {"completion_on": t.get("completion_on"), "basenames": basenames}
+                dirty = True
+
+    # entrées des torrents supprimés de qBittorrent (ou hors du périmètre indexé) retirées
+    live = {t.get("hash") for t in torrents}
+    if any(h not in live for h in cache):
+        cache = {h: v for h, v in cache.items() if h in live}
+        dirty = True
+
+    if dirty:
+        try:
+            save_files_cache(FILES_CACHE_JSON, cache)
+        except OSError as e:
+            print(f"[WARN] Impossible d'écrire le cache {FILES_CACHE_JSON} : {e}", file=sys.stderr)
+
+    files_index: Dict[str, str] = {}
+    for t in torrents:
+        h = t.get("hash")
+        for base in basenames_by_hash.get(h, ()):
+            # le premier torrent trouvé l'emporte, comme l'ancien parcours séquentiel
+            files_index.setdefault(base, h)
+    if VERBOSE:
+        print(f"[INFO] qBittorrent : {len(to_fetch)} listes de fichiers récupérées, "
+              f"{len(torrents) - len(to_fetch)} depuis le cache", file=sys.stderr)
+    return files_index
 
 # ============================================================
 # ============================ MAIN ==========================
 # ============================================================
 
+def fetch_radarr_movies() -> List[Dict[str, Any]]:
+    with make_session() as radarr:
+        radarr.headers["X-Api-Key"] = RADARR_APIKEY
+        return radarr_get_movies(radarr)
+
+def fetch_qb_torrents(session: requests.Session) -> List[Dict[str, Any]]:
+    qb_login(session)
+    return qb_get_torrents(session)
+
 def main():
     if not RADARR_APIKEY or "PUT_RADARR_API_KEY" in RADARR_APIKEY:
         print("[ERROR] Radarr API key non configurée", file=sys.stderr)
         return 1
 
-    # --- Radarr ---
-    movies = radarr_get_movies()
+    # --- Radarr et qBittorrent en parallèle (serveurs indépendants) ---
+    session = make_session(pool_size=QB_FILES_WORKERS)
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        f_movies = ex.submit(fetch_radarr_movies)
+        f_torrents = ex.submit(fetch_qb_torrents, session)
+        movies = f_movies.result()
+        torrents = f_torrents.result()
     if VERBOSE:
         print(f"[INFO] Radarr : {len(movies)} films trouvés", file=sys.stderr)
-
-    # --- qBittorrent ---
-    session = requests.Session()
-    qb_login(session)
-    torrents = qb_get_torrents(session)
-    if VERBOSE:
         print(f"[INFO] qBittorrent : {len(torrents)} torrents chargés", file=sys.stderr)
 
-    # Index torrents par save_path
-    torrents_by_path: Dict[str, List[Dict[str, Any]]] = {}
+    # Un seul passage sur les torrents : save_path normalisé une fois par torrent,
+    # index save_path -> hash du premier torrent, et candidats pour le fallback
+    movies_root = normalize(QBT_MOVIES_ROOT)
+    hash_by_path: Dict[str, str] = {}
+    fallback_torrents: List[Dict[str, Any]] = []
     for t in torrents:
         sp = normalize(t.get("save_path") or t.get("savePath"))
-        torrents_by_path.setdefault(sp, []).append(t)
-
-    output = []
-
-    for m in movies:
-        movie_id = m.get("id")
-        title = m.get("title")
-        moviefile = m.get("movieFile")
-
-        moviefile_path = None
-        folder = None
-        mkv_name = None
-
-        if moviefile:
-            moviefile_path = normalize(moviefile.get("path"))
-            folder = get_parent(moviefile_path)
-            mkv_name = extract_mkv(moviefile_path)
-
-        entry = {
-            "radarr_id": movie_id,
-            "title": title,
-            "folder": folder,
-            "mkv_file": mkv_name,
-            "torrent_hash": None
-        }
-
-        # 1️⃣ Match direct par save_path
-        if folder and folder in torrents_by_path:
-            entry["torrent_hash"] = torrents_by_path[folder][0].get("hash")
-
-        # 2️⃣ Fallback : recherche du fichier dans les torrents
-        if not entry["torrent_hash"] and mkv_name:
-            mkv_lower = mkv_name.lower()
-            for t in torrents:
-                try:
-                    files = qb_get_torrent_files(session, t.get("hash"))
-                    for f in files:
-                        if mkv_lower == f.get("name", "").lower().split("/")[-1]:
-                            entry["torrent_hash"] = t.get("hash")
-                            break
-                except Exception:
-                    continue
-                if entry["torrent_hash"]:
-                    break
+        hash_by_path.setdefault(sp, t.get("hash"))
+        if not movies_root or under_root(sp, movies_root):
+            fallback_torrents.append(t)
+    if VERBOSE and movies_root:
+        print(f"[INFO] qBittorrent : {len(fallback_torrents)} torrents sous {movies_root}", file=sys.stderr)
 
-        output.append(entry)
+    # Index des fichiers construit à la demande (uniquement si un fallback est nécessaire)
+    files_index: Optional[Dict[str, str]] = None
 
-    OUTPUT_JSON.write_text(
-        json.dumps(output, indent=2, ensure_ascii=False),
-        encoding="utf-8"
-    )
-
-    print(f"[OK] Export terminé → {OUTPUT_JSON} ({len(output)} films)", file=sys.stderr)
+    out_path = OUTPUT_JSON.with_suffix(".jsonl") if OUTPUT_JSONL else OUTPUT_JSON
+    output = []
+    count = 0
+
+    # écrit dans un .tmp remplacé à la fin : une interruption (appels qB /files
+    # pendant la boucle) ne laisse pas d'export partiel à la place de l'ancien
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as out:
+        for m in movies:
+            movie_id = m.get("id")
+            title = m.get("title")
+            moviefile = m.get("movieFile")
+
+            moviefile_path, folder, mkv_name = split_moviefile(moviefile.get("path") if moviefile else None)
+
+            entry = {
+                "radarr_id": movie_id,
+                "title": title,
+                "folder": folder,
+                "mkv_file": mkv_name,
+                "torrent_hash": None
+            }
+
+            # 1️⃣ Match direct par save_path
+            if folder and folder in hash_by_path:
+                entry["torrent_hash"] = hash_by_path[folder]
+
+            # 2️⃣ Fallback : recherche du fichier dans les torrents
+            if not entry["torrent_hash"] and mkv_name:
+                if files_index is None:
+                    files_index = build_files_index(session, fallback_torrents)
+                    if VERBOSE:
+                        print(f"[INFO] qBittorrent : {len(files_index)} fichiers indexés", file=sys.stderr)
+                entry["torrent_hash"] = files_index.get(mkv_name.lower())
+
+            count += 1
+            if OUTPUT_JSONL:
+                out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            else:
+                output.append(entry)
+
+        if not OUTPUT_JSONL:
+            json.dump(output, out, indent=JSON_INDENT, ensure_ascii=False)
+    tmp_path.replace(out_path)
+
+    print(f"[OK] Export terminé → {out_path} ({count} films)", file=sys.stderr)
     return 0
 
 if __name__ == "__main__":
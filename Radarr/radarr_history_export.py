@@ -8,15 +8,25 @@ Récupère l'historique Radarr (pagination) et pour chaque film:
  - retourne title, tmdbId, movieId, lastSeen, last_event_type
  - calcule importedFilePath (chemin complet du .mkv si possible)
  - calcule folder (dossier complet contenant le MKV)
-Écrit deux fichiers: OUT_TXT et OUT_JSON.
+Écrit deux fichiers: OUT_TXT et OUT_JSON (ou .jsonl, une ligne par film, si OUT_JSONL).
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 import time
 import json
+import math
+import re
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timezone
-import re
+
+try:
+    # décodage JSON plus rapide si orjson est installé (optionnel)
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
 
 # ---------------------------
 # CONFIG (modifier ici)
@@ -26,44 +36,93 @@ API_KEY = "PUT_YOUR_API_KEY_HERE"         # <-- mettre ta clé API Radarr
 PAGE_SIZE = 200
 INCLUDE_MOVIE = True
 SLEEP_BETWEEN_PAGES = 0.05
+PAGE_WORKERS = 4                          # pages récupérées en parallèle
 MAX_RETRIES = 5
 BACKOFF_FACTOR = 1.5
+# Cache disque des pages d'historique (secondes, 0 = désactivé ; nécessite requests-cache).
+# Les pages sont triées du plus récent au plus ancien : un cache trop long masque les nouveaux événements.
+HTTP_CACHE_TTL = 0
+HTTP_CACHE_NAME = "radarr_http_cache"
 
 OUT_TXT = Path("./radarr_history_laststate.txt")
 OUT_JSON = Path("./radarr_history_laststate.json")
+WRITE_BUFFER = 1 << 20                    # tampon d'écriture des fichiers de sortie
+JSON_INDENT = None                        # 2 pour un JSON lisible (plus lent et plus gros)
+OUT_JSONL = False                         # True: une ligne {clé: film} par film dans OUT_JSON en .jsonl
 # ---------------------------
 
+# text output templates (one block per film)
+TXT_HEADER = "Film {idx}: {title} (tmdbId={tmdb})\n"
+TXT_LAST_SEEN = "  lastSeen: {last_seen}\n"
+TXT_BODY = (
+    "  lastHash: {last_hash}\n"
+    "  importedFilePath: {imported_fp}\n"
+    "  folder: {folder}\n"
+    "  events_count: {events_count}\n"
+)
+
 # ---------------- helpers ----------------
 def iso_parse_safe(s):
-    if not s:
-        return None
+    return _iso_parse_cached(str(s)) if s else None
+
+@lru_cache(maxsize=100_000)
+def _iso_parse_cached(s: str):
+    # mêmes horodatages fréquents (imports groupés) : un seul parse par chaîne
     try:
-        return datetime.fromisoformat(str(s).replace("Z", "+00:00"))
-    except Exception:
-        try:
-            return datetime.strptime(str(s), "%Y-%m-%dT%H:%M:%S")
-        except Exception:
+        # Python >= 3.11 accepts the trailing "Z" directly
+        return datetime.fromisoformat(s)
+    except ValueError:
+        if "Z" not in s:
             return None
+    try:
+        return datetime.fromisoformat(s.replace("Z", "+00:00"))
+    except ValueError:
+        return None
 
 def datetime_min():
     return datetime(1970,1,1, tzinfo=timezone.utc)
 
+_MULTI_SLASH = re.compile(r'/{2,}')
+
 def normalize_path(p: str) -> str:
     if not p:
         return p
+    # fast path: already a clean forward-slash path (the common case)
+    if "\\" not in p and "//" not in p:
+        return p.strip()
     s = p.replace("\\", "/")
-    # remove repeated slashes but keep leading slash
-    s = re.sub(r'/{2,}', '/', s)
-    return s.strip()
+    # remove repeated slashes but keep leading slash (one regex pass)
+    return _MULTI_SLASH.sub('/', s).strip()
 
-def request_with_retry(url, headers, params=None, timeout=30):
+def make_session(api_key, pool_size=PAGE_WORKERS):
+    # keep-alive: une connexion par worker, réutilisée d'une page à l'autre
+    s = None
+    if HTTP_CACHE_TTL > 0:
+        try:
+            import requests_cache
+            s = requests_cache.CachedSession(HTTP_CACHE_NAME, backend='sqlite',
+                                             expire_after=HTTP_CACHE_TTL, allowable_methods=('GET',))
+        except ImportError:
+            print("[WARN] requests-cache non installé : cache HTTP désactivé", flush=True)
+    if s is None:
+        s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    s.headers['X-Api-Key'] = api_key
+    # réponses JSON compressées (requests les décompresse de façon transparente)
+    s.headers['Accept'] = 'application/json'
+    s.headers['Accept-Encoding'] = 'gzip, deflate'
+    return s
+
+def request_with_retry(session, url, params=None, timeout=30):
     attempt = 0
     while attempt < MAX_RETRIES:
         try:
-            r = requests.get(url, headers=headers, params=params, timeout=timeout)
+            r = session.get(url, params=params, timeout=timeout)
             if r.status_code == 200:
                 try:
-                    return r.json()
+                    return json_loads(r.content)
                 except ValueError:
                     raise RuntimeError("Réponse non-JSON de l'API Radarr")
             if r.status_code == 429:
@@ -88,81 +147,149 @@ def safe_raw(ev):
     data = raw.get('data') if isinstance(raw.get('data'), dict) else {}
     return raw, data
 
+def event_raw(ev):
+    # (raw.data, raw) computed once per event; lookup order is data, raw, event
+    cached = ev.get('_raw')
+    if cached is None:
+        raw, data = safe_raw(ev)
+        cached = ev['_raw'] = (data, raw)
+    return cached
+
 def get_from_event(ev, *keys):
-    raw, data = safe_raw(ev)
+    data, raw = event_raw(ev)
     for k in keys:
-        v = data.get(k)
-        if v is not None:
-            return v
-        v = raw.get(k)
-        if v is not None:
-            return v
-        v = ev.get(k)
-        if v is not None:
-            return v
+        for d in (data, raw, ev):
+            v = d.get(k)
+            if v is not None:
+                return v
+    return None
+
+def extract_page_items(data):
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        for key in ('records','items','history','data','results'):
+            if key in data and isinstance(data[key], list):
+                return data[key]
+        raise RuntimeError("Réponse inattendue de l'API Radarr (dict sans liste).")
+    raise RuntimeError("Réponse inattendue de l'API Radarr (format).")
+
+def total_records(data):
+    if isinstance(data, dict):
+        total = data.get('totalRecords')
+        if isinstance(total, int) and total >= 0:
+            return total
     return None
 
 # fetch all history pages
 def fetch_all_history(base_url, api_key, page_size=200, include_movie=True):
-    headers = {'X-Api-Key': api_key}
-    all_items = []
-    page = 1
-    while True:
+    session = make_session(api_key)
+    url = base_url.rstrip('/') + '/api/v3/history'
+
+    def fetch_page(page):
         params = {'page': page, 'pageSize': page_size}
         if include_movie:
             params['includeMovie'] = 'true'
-        url = base_url.rstrip('/') + '/api/v3/history'
         print(f"[INFO] Fetch page {page}...", flush=True)
-        data = request_with_retry(url, headers, params=params)
-        if isinstance(data, list):
-            page_items = data
-        elif isinstance(data, dict):
-            page_items = None
-            for key in ('records','items','history','data','results'):
-                if key in data and isinstance(data[key], list):
-                    page_items = data[key]; break
-            if page_items is None:
-                raise RuntimeError("Réponse inattendue de l'API Radarr (dict sans liste).")
-        else:
-            raise RuntimeError("Réponse inattendue de l'API Radarr (format).")
-        print(f"[INFO] -> reçus {len(page_items)} événements", flush=True)
-        if not page_items:
-            break
-        all_items.extend(page_items)
-        if len(page_items) < page_size:
-            break
-        page += 1
-        time.sleep(SLEEP_BETWEEN_PAGES)
-    return all_items
+        return request_with_retry(session, url, params=params)
+
+    with session:
+        first = fetch_page(1)
+        all_items = extract_page_items(first)
+        print(f"[INFO] -> reçus {len(all_items)} événements", flush=True)
+        if len(all_items) < page_size:
+            return all_items
+
+        total = total_records(first)
+        with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as ex:
+            if total is not None:
+                # totalRecords connu : toutes les pages restantes en parallèle
+                pages = math.ceil(total / page_size)
+                print(f"[INFO] totalRecords={total} -> {pages} pages", flush=True)
+                for data in ex.map(fetch_page, range(2, pages + 1)):
+                    page_items = extract_page_items(data)
+                    print(f"[INFO] -> reçus {len(page_items)} événements", flush=True)
+                    all_items.extend(page_items)
+                return all_items
+
+            # sinon : lots de PAGE_WORKERS pages jusqu'à la première page incomplète
+            page = 2
+            while True:
+                for data in ex.map(fetch_page, range(page, page + PAGE_WORKERS)):
+                    page_items = extract_page_items(data)
+                    print(f"[INFO] -> reçus {len(page_items)} événements", flush=True)
+                    all_items.extend(page_items)
+                    if len(page_items) < page_size:
+                        return all_items
+                page += PAGE_WORKERS
+                time.sleep(SLEEP_BETWEEN_PAGES)
 
 # group events by movie (prefer id if present)
 def group_events_by_movie(history_items):
     grouped = {}
     for ev in history_items:
         movie_info = ev.get('movie') or ev.get('Movie') or {}
+        is_dict = isinstance(movie_info, dict)
         mid = None
-        if isinstance(movie_info, dict):
+        if is_dict:
             mid = movie_info.get('id') or movie_info.get('tmdbId') or movie_info.get('movieId')
-        title = (movie_info.get('title') if isinstance(movie_info, dict) else None) or ev.get('title') or "Unknown Title"
+        title = (movie_info.get('title') if is_dict else None) or ev.get('title') or "Unknown Title"
         key = str(mid or title)
-        grouped.setdefault(key, {'movie': movie_info if isinstance(movie_info, dict) else {}, 'events': []})
-        grouped[key]['events'].append(ev)
+        # groupe créé au premier événement seulement (pas de dict jetable par itération)
+        g = grouped.get(key)
+        if g is None:
+            g = grouped[key] = {'movie': movie_info if is_dict else {}, 'events': []}
+        g['events'].append(ev)
     return grouped
 
 def event_date(ev):
-    d = ev.get('date_iso') or ev.get('date') or ev.get('Date')
-    dt = iso_parse_safe(d)
-    return dt or datetime_min()
-
-# find last hash used for a set of events
-def find_last_hash(events):
-    sorted_ev = sorted(events, key=lambda e: event_date(e))
-    for ev in reversed(sorted_ev):
-        # check common fields that may contain the torrent/download hash/id
-        h = ev.get('downloadId') or get_from_event(ev, 'downloadId', 'torrentInfoHash', 'torrentHash', 'id')
-        if h:
-            return str(h)
-    return None
+    # date parsée une seule fois puis mise en cache sur l'événement
+    dt = ev.get('_dt')
+    if dt is None:
+        d = ev.get('date_iso') or ev.get('date') or ev.get('Date')
+        dt = iso_parse_safe(d) or datetime_min()
+        ev['_dt'] = dt
+    return dt
+
+def event_hash(ev):
+    # check common fields that may contain the torrent/download hash/id
+    h = ev.get('downloadId') or get_from_event(ev, 'downloadId', 'torrentInfoHash', 'torrentHash', 'id')
+    return str(h) if h else None
+
+def event_path_fields(ev):
+    """(importedFilePath, importedPath, movieFile.path|relativePath) of an event."""
+    data, raw = event_raw(ev)
+    ipf = data.get('importedFilePath') or raw.get('importedFilePath') or ev.get('importedFilePath')
+    ip = data.get('importedPath') or raw.get('importedPath') or ev.get('importedPath')
+    mvf = data.get('movieFile') or raw.get('movieFile') or ev.get('movieFile')
+    mvf_path = (mvf.get('path') or mvf.get('relativePath')) if isinstance(mvf, dict) else None
+    return ipf, ip, mvf_path
+
+# single pass over the events of a movie
+def summarize_events(events):
+    """
+    Return (last_event, last_hash, path_fields):
+     - last_event: most recent event (first one on ties)
+     - last_hash: hash of the most recent event carrying one (last one on ties)
+     - path_fields: event_path_fields() of the most recent event carrying a path
+    """
+    last_ev = last_dt = None
+    last_hash = hash_dt = None
+    path_fields = path_dt = None
+    for ev in events:
+        dt = event_date(ev)
+        if last_dt is None or dt > last_dt:
+            last_ev, last_dt = ev, dt
+        # older than the current hash holder: no need to look for a hash
+        if hash_dt is None or dt >= hash_dt:
+            h = event_hash(ev)
+            if h:
+                last_hash, hash_dt = h, dt
+        if path_dt is None or dt > path_dt:
+            fields = event_path_fields(ev)
+            if any(fields):
+                path_fields, path_dt = fields, dt
+    return last_ev, last_hash, path_fields
 
 # construct a plausible filename from title/year/tmdb
 def build_filename(title, year, tmdb):
@@ -171,8 +298,39 @@ def build_filename(title, year, tmdb):
         return f"{safe_title} ({year}) {tmdb or ''}.mkv".strip()
     return f"{safe_title} {tmdb or ''}.mkv".strip()
 
+# chemins déjà normalisés en "/" : découpe de chaînes au lieu d'objets Path
+def _parent(p):
+    """Équivalent de str(Path(p).parent)."""
+    q = p.rstrip('/')
+    if not q:
+        return '/' if p else '.'
+    i = q.rfind('/')
+    if i < 0:
+        return '.'
+    return q[:i] or '/'
+
+def _name(p):
+    """Équivalent de Path(p).name."""
+    q = p.rstrip('/')
+    return q[q.rfind('/') + 1:]
+
+def _join(folder, name):
+    """Équivalent de str(Path(folder) / name) pour un nom sans "/"."""
+    base = folder.rstrip('/')
+    if not name:
+        return base or ('/' if folder else '.')
+    if not base:
+        return '/' + name if folder else name
+    return base + '/' + name
+
+def _result(fp):
+    """(fp, folder) : fp normalisé une seule fois, folder = parent déjà normalisé."""
+    fp = normalize_path(fp)
+    # parent d'un chemin normalisé : seuls des espaces finaux restent à retirer
+    return fp, _parent(fp).rstrip()
+
 # find the best importedFilePath (complete path to MKV) and folder (parent folder)
-def find_best_filepath_and_folder(movie_obj, events):
+def find_best_filepath_and_folder(movie_obj, path_fields):
     movie = movie_obj or {}
     # 1) try movie-level movieFile.path (full path to file)
     mf = movie.get('movieFile') or movie.get('MovieFile') or {}
@@ -185,83 +343,71 @@ def find_best_filepath_and_folder(movie_obj, events):
         p = mf.get('path')
         rel = mf.get('relativePath') or None
         if p:
-            fp = normalize_path(p)
-            folder = str(Path(fp).parent)
-            return fp, folder
+            return _result(p)
         if rel and movie_path_field:
             # relativePath often like "Title (Year)/Title (Year).mkv"
             # construct full path
             rel_norm = normalize_path(rel)
-            fp = str(Path(normalize_path(movie_path_field)) / Path(rel_norm).name)
-            fp = normalize_path(fp)
-            folder = str(Path(fp).parent)
-            return fp, folder
+            return _result(_join(normalize_path(movie_path_field), _name(rel_norm)))
 
-    # 2) scan events newest first for importedFilePath or importedPath or event.movieFile
-    for ev in sorted(events, key=lambda e: event_date(e), reverse=True):
-        raw, data = safe_raw(ev)
+    # 2) newest event with importedFilePath or importedPath or event.movieFile (see summarize_events)
+    if path_fields:
+        ipf, ip, mvf_path = path_fields
         # explicit importedFilePath (file)
-        ipf = data.get('importedFilePath') or raw.get('importedFilePath') or ev.get('importedFilePath')
         if ipf:
-            fp = normalize_path(ipf)
-            folder = str(Path(fp).parent)
-            return fp, folder
+            return _result(ipf)
         # importedPath (folder only)
-        ip = data.get('importedPath') or raw.get('importedPath') or ev.get('importedPath')
         if ip:
             folder_candidate = normalize_path(ip)
-            # Try to infer filename: prefer movie.movieFile.rel if any in events later
-            # search for movieFile in this event
-            mvf = data.get('movieFile') or raw.get('movieFile') or ev.get('movieFile')
-            if isinstance(mvf, dict):
-                p = mvf.get('path') or mvf.get('relativePath')
-                if p:
-                    # if p is relative path, use basename
-                    name = Path(normalize_path(p)).name
-                    fp = str(Path(folder_candidate) / name)
-                    return normalize_path(fp), str(Path(fp).parent)
+            # Try to infer filename from the movieFile of this event
+            if mvf_path:
+                # if p is relative path, use basename
+                name = _name(normalize_path(mvf_path))
+                return _result(_join(folder_candidate, name))
             # fallback: build plausible filename from title/year/tmdb
             if title or tmdb:
                 name = build_filename(title, year, tmdb)
-                fp = str(Path(folder_candidate) / name)
-                return normalize_path(fp), str(Path(fp).parent)
+                return _result(_join(folder_candidate, name))
             # else return folder only (no filename)
-            return folder_candidate, str(Path(folder_candidate).parent)
+            return _result(folder_candidate)
 
         # event-level movieFile
-        mvf = data.get('movieFile') or raw.get('movieFile') or ev.get('movieFile')
-        if isinstance(mvf, dict):
-            p = mvf.get('path') or mvf.get('relativePath')
-            if p:
-                p_norm = normalize_path(p)
-                # if relative and movie_path_field exists, construct
-                if movie_path_field and not Path(p_norm).is_absolute():
-                    fp = str(Path(normalize_path(movie_path_field)) / Path(p_norm).name)
-                else:
-                    fp = p_norm
-                fp = normalize_path(fp)
-                folder = str(Path(fp).parent)
-                return fp, folder
+        p_norm = normalize_path(mvf_path)
+        # if relative and movie_path_field exists, construct
+        if movie_path_field and not p_norm.startswith('/'):
+            fp = _join(normalize_path(movie_path_field), _name(p_norm))
+        else:
+            fp = p_norm
+        return _result(fp)
 
     # 3) fallback to movie.path (folder) and construct plausible filename if possible
     if movie_path_field:
         folder = normalize_path(movie_path_field)
         if title or tmdb:
             name = build_filename(title, year, tmdb)
-            fp = str(Path(folder) / name)
-            return normalize_path(fp), str(Path(fp).parent)
-        return folder, str(Path(folder).parent)
+            return _result(_join(folder, name))
+        return _result(folder)
 
     return None, None
 
-def get_last_event_info(events):
-    if not events:
+def get_last_event_info(ev):
+    if not ev:
         return None, None
-    ev = max(events, key=lambda e: event_date(e))
     etype = ev.get('eventType') or ev.get('type') or ev.get('name') or ev.get('status') or None
     d = ev.get('date_iso') or ev.get('date') or ev.get('Date')
     return etype, (d or None)
 
+# JSON object written member by member (same output as json.dump of the whole dict)
+def write_json_member(f, key, record, first):
+    k = json.dumps(key, ensure_ascii=False)
+    if JSON_INDENT:
+        pad = "\n" + " " * JSON_INDENT
+        v = json.dumps(record, indent=JSON_INDENT, ensure_ascii=False).replace("\n", pad)
+        f.write(("" if first else ",") + pad + k + ": " + v)
+    else:
+        v = json.dumps(record, ensure_ascii=False)
+        f.write(("" if first else ", ") + k + ": " + v)
+
 # ---------------- main ----------------
 def main():
     if not API_KEY or API_KEY == "PUT_YOUR_API_KEY_HERE":
@@ -275,54 +421,66 @@ def main():
     grouped = group_events_by_movie(history)
     print(f"[INFO] Total films détectés: {len(grouped)}", flush=True)
 
-    out_lines = []
-    out_json = {}
-    idx = 0
-
-    for key, obj in grouped.items():
-        idx += 1
-        movie_info = obj.get('movie') or {}
-        events = obj.get('events') or []
-
-        title = movie_info.get('title') or movie_info.get('originalTitle') or movie_info.get('name') or "Unknown"
-        tmdb = movie_info.get('tmdbId') or movie_info.get('id') or None
-        movie_id = movie_info.get('id') or None
-        events_count = len(events)
-
-        last_hash = find_last_hash(events)  # may be None
-        imported_fp, folder = find_best_filepath_and_folder(movie_info, events)
-        # ensure folder ends with single slash removed? keep no trailing slash but folder is full path
-        if folder:
-            folder = normalize_path(folder)
-        last_event_type, last_seen = get_last_event_info(events)
-
-        record = {
-            "title": title,
-            "tmdbId": tmdb,
-            "movieId": movie_id,
-            "events_count": events_count,
-            "lastHash": last_hash,
-            "last_event_type": last_event_type,
-            "lastSeen": last_seen,
-            "importedFilePath": imported_fp,
-            "folder": folder
-        }
-
-        out_json[key] = record
-
-        out_lines.append(f"Film {idx}: {title} (tmdbId={tmdb})")
-        if last_seen:
-            out_lines.append(f"  lastSeen: {last_seen}")
-        out_lines.append(f"  lastHash: {last_hash or 'None'}")
-        out_lines.append(f"  importedFilePath: {imported_fp or 'None'}")
-        out_lines.append(f"  folder: {folder or 'None'}")
-        out_lines.append(f"  events_count: {events_count}")
-        out_lines.append("")
-
-    # write outputs
-    OUT_TXT.write_text("\n".join(out_lines), encoding="utf-8")
-    OUT_JSON.write_text(json.dumps(out_json, indent=2, ensure_ascii=False), encoding="utf-8")
-    print(f"[OK] Écrit {len(out_json)} films dans {OUT_TXT} et {OUT_JSON}", flush=True)
+    out_json_path = OUT_JSON.with_suffix(".jsonl") if OUT_JSONL else OUT_JSON
+    count = 0
+
+    # écriture dans des .tmp remplacés une fois complets : pas d'export partiel en cas d'erreur
+    txt_tmp = OUT_TXT.with_name(OUT_TXT.name + ".tmp")
+    json_tmp = out_json_path.with_name(out_json_path.name + ".tmp")
+    with txt_tmp.open("w", encoding="utf-8", buffering=WRITE_BUFFER) as txt, \
+         json_tmp.open("w", encoding="utf-8", buffering=WRITE_BUFFER) as jf:
+        if not OUT_JSONL:
+            jf.write("{")
+        for idx, (key, obj) in enumerate(grouped.items(), 1):
+            movie_info = obj.get('movie') or {}
+            events = obj.get('events') or []
+
+            title = movie_info.get('title') or movie_info.get('originalTitle') or movie_info.get('name') or "Unknown"
+            tmdb = movie_info.get('tmdbId') or movie_info.get('id') or None
+            movie_id = movie_info.get('id') or None
+            events_count = len(events)
+
+            last_ev, last_hash, path_fields = summarize_events(events)  # last_hash may be None
+            imported_fp, folder = find_best_filepath_and_folder(movie_info, path_fields)
+            last_event_type, last_seen = get_last_event_info(last_ev)
+
+            record = {
+                "title": title,
+                "tmdbId": tmdb,
+                "movieId": movie_id,
+                "events_count": events_count,
+                "lastHash": last_hash,
+                "last_event_type": last_event_type,
+                "lastSeen": last_seen,
+                "importedFilePath": imported_fp,
+                "folder": folder
+            }
+
+            if OUT_JSONL:
+                jf.write(json.dumps({key: record}, ensure_ascii=False) + "\n")
+            else:
+                write_json_member(jf, key, record, first=(count == 0))
+            count += 1
+
+            # text output written as we go (blank line between films)
+            if idx > 1:
+                txt.write("\n")
+            txt.write(TXT_HEADER.format(idx=idx, title=title, tmdb=tmdb))
+            if last_seen:
+                txt.write(TXT_LAST_SEEN.format(last_seen=last_seen))
+            txt.write(TXT_BODY.format(
+                last_hash=last_hash or 'None',
+                imported_fp=imported_fp or 'None',
+                folder=folder or 'None',
+                events_count=events_count,
+            ))
+
+        if not OUT_JSONL:
+            jf.write("\n}" if JSON_INDENT and count else "}")
+    txt_tmp.replace(OUT_TXT)
+    json_tmp.replace(out_json_path)
+
+    print(f"[OK] Écrit {count} films dans {OUT_TXT} et {out_json_path}", flush=True)
 
 if __name__ == "__main__":
     main()
@@ -12,11 +12,21 @@ Usage:
 Sortie: print console + option --out csv/json
 """
 import argparse
+import sys
 import requests
+from requests.adapters import HTTPAdapter
 import csv
 import json
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from pathlib import Path
 
+try:
+    # décodage JSON plus rapide si orjson est installé (optionnel)
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
 def bytes_to_human(n):
     # simple human readable
     for unit in ['B','KiB','MiB','GiB','TiB']:
@@ -25,85 +35,158 @@ def bytes_to_human(n):
         n /= 1024.0
     return f"{n:.1f} PiB"
 
+# session HTTP partagée par tous les appels (remplacée par enable_http_cache)
+SESSION = requests.Session()
+HTTP_CACHE_NAME = 'sonarr_http_cache'
+
+def enable_http_cache(ttl):
+    """Cache disque (sqlite) des GET pendant ttl secondes, si requests-cache est installé."""
+    global SESSION
+    try:
+        import requests_cache
+    except ImportError:
+        print("[WARN] requests-cache non installé : --cache-ttl ignoré", file=sys.stderr)
+        return
+    SESSION = requests_cache.CachedSession(HTTP_CACHE_NAME, backend='sqlite', expire_after=ttl,
+                                           allowable_methods=('GET',))
+
+def set_pool_size(pool_size):
+    # keep-alive : une connexion par worker (pool par défaut = 10, insuffisant si --workers > 10)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+    SESSION.mount('http://', adapter)
+    SESSION.mount('https://', adapter)
+
 def get(api_base, api_key, path, params=None):
-    headers = {'X-Api-Key': api_key}
+    # réponses JSON compressées (requests les décompresse de façon transparente)
+    headers = {'X-Api-Key': api_key, 'Accept': 'application/json', 'Accept-Encoding': 'gzip, deflate'}
     url = api_base.rstrip('/') + '/api/v3/' + path.lstrip('/')
-    r = requests.get(url, headers=headers, params=params, timeout=30)
+    r = SESSION.get(url, headers=headers, params=params, timeout=30)
     r.raise_for_status()
-    return r.json()
+    return json_loads(r.content)
 
-def build_report(api_base, api_key, series_filter=None, verbose=False):
-    series_list = get(api_base, api_key, 'series')
-    report = []
-    for s in series_list:
-        sid = s.get('id')
-        title = s.get('title') or s.get('seriesName') or s.get('title')
-        if series_filter and series_filter.lower() not in title.lower():
-            continue
+def series_title(s):
+    return s.get('title') or s.get('seriesName') or s.get('title')
+
+def series_report(api_base, api_key, s, verbose=False):
+    sid = s.get('id')
+    title = series_title(s)
 
-        # 1) get episode files for this series (unique physical files)
-        # endpoint: /api/episodefile?seriesId={sid}
+    # 1) get episode files for this series (unique physical files)
+    # endpoint: /api/episodefile?seriesId={sid}
+    try:
+        episode_files = get(api_base, api_key, 'episodefile', params={'seriesId': sid})
+    except requests.HTTPError as e:
+        # some Sonarr builds use 'episodefiles' plural; try both
         try:
-            episode_files = get(api_base, api_key, 'episodefile', params={'seriesId': sid})
-        except requests.HTTPError as e:
-            # some Sonarr builds use 'episodefiles' plural; try both
-            try:
-                episode_files = get(api_base, api_key, 'episodefiles', params={'seriesId': sid})
-            except Exception:
-                if verbose:
-                    print(f"Erreur récupération episode files for {title} ({sid}): {e}")
-                episode_files = []
-
-        total_bytes = 0
-        seen_file_ids = set()
-        for ef in episode_files:
-            # ef is expected to contain 'id' and 'size' (bytes)
-            fid = ef.get('id') or ef.get('episodeFileId') or ef.get('fileId')
-            if fid is None:
-                # fallback: try path as unique id
-                fid = ef.get('path')
-            if fid in seen_file_ids:
-                continue
-            seen_file_ids.add(fid)
-            size = ef.get('size') or ef.get('sizeOnDisk') or 0
-            # some older endpoints or wrappers might provide strings
-            try:
-                size = int(size)
-            except Exception:
-                size = 0
-            total_bytes += size
-
-        # 2) count downloaded episodes (hasFile true)
+            episode_files = get(api_base, api_key, 'episodefiles', params={'seriesId': sid})
+        except Exception:
+            if verbose:
+                print(f"Erreur récupération episode files for {title} ({sid}): {e}")
+            episode_files = []
+
+    # 2) count downloaded episodes (hasFile true)
+    try:
+        episodes = get(api_base, api_key, 'episode', params={'seriesId': sid})
+    except Exception:
+        # fallback: episodes endpoint might require no params and filter locally
         try:
-            episodes = get(api_base, api_key, 'episode', params={'seriesId': sid})
+            all_eps = get(api_base, api_key, 'episode')
+            episodes = [e for e in all_eps if e.get('seriesId') == sid]
         except Exception:
-            # fallback: episodes endpoint might require no params and filter locally
-            try:
-                all_eps = get(api_base, api_key, 'episode')
-                episodes = [e for e in all_eps if e.get('seriesId') == sid]
-            except Exception:
-                episodes = []
-
-        downloaded_eps = 0
-        for ep in episodes:
-            # Sonarr episode object: 'hasFile' boolean
-            if ep.get('hasFile'):
-                downloaded_eps += 1
-
-        avg_per_episode = (total_bytes / downloaded_eps) if downloaded_eps > 0 else 0
-
-        report.append({
-            'seriesId': sid,
-            'title': title,
-            'total_bytes': total_bytes,
-            'downloaded_episodes': downloaded_eps,
-            'avg_bytes_per_episode': int(avg_per_episode),
-            'sizeOnDisk_series_field': s.get('sizeOnDisk', None),  # for cross-check
-            'path': s.get('path') or s.get('rootFolderPath')
-        })
+            episodes = []
+
+    return summarize_series(s, episode_files, episodes)
+
+def summarize_series(s, episode_files, episodes):
+    """Agrège les fichiers (dédupliqués) et les épisodes téléchargés d'une série."""
+    sid = s.get('id')
+    title = series_title(s)
+
+    total_bytes = 0
+    seen_file_ids = set()
+    for ef in episode_files:
+        # ef is expected to contain 'id' and 'size' (bytes)
+        fid = ef.get('id') or ef.get('episodeFileId') or ef.get('fileId')
+        if fid is None:
+            # fallback: try path as unique id
+            fid = ef.get('path')
+        if fid in seen_file_ids:
+            continue
+        seen_file_ids.add(fid)
+        size = ef.get('size') or ef.get('sizeOnDisk') or 0
+        # some older endpoints or wrappers might provide strings
+        try:
+            size = int(size)
+        except Exception:
+            size = 0
+        total_bytes += size
+
+    # Sonarr episode object: 'hasFile' boolean
+    downloaded_eps = sum(1 for ep in episodes if ep.get('hasFile'))
+
+    avg_per_episode = (total_bytes / downloaded_eps) if downloaded_eps > 0 else 0
+
+    return {
+        'seriesId': sid,
+        'title': title,
+        'total_bytes': total_bytes,
+        'downloaded_episodes': downloaded_eps,
+        'avg_bytes_per_episode': int(avg_per_episode),
+        'sizeOnDisk_series_field': s.get('sizeOnDisk', None),  # for cross-check
+        'path': s.get('path') or s.get('rootFolderPath')
+    }
+
+def stats_report(s):
+    """Série résumée à partir de ses `statistics` (déjà présentes dans la réponse /series)."""
+    stats = s.get('statistics') or {}
+    try:
+        total_bytes = int(stats.get('sizeOnDisk') or 0)
+        downloaded_eps = int(stats.get('episodeFileCount') or 0)
+    except (TypeError, ValueError):
+        total_bytes, downloaded_eps = 0, 0
+    avg_per_episode = (total_bytes / downloaded_eps) if downloaded_eps > 0 else 0
+    return {
+        'seriesId': s.get('id'),
+        'title': series_title(s),
+        'total_bytes': total_bytes,
+        'downloaded_episodes': downloaded_eps,
+        'avg_bytes_per_episode': int(avg_per_episode),
+        'sizeOnDisk_series_field': s.get('sizeOnDisk', stats.get('sizeOnDisk')),  # for cross-check
+        'path': s.get('path') or s.get('rootFolderPath')
+    }
+
+def build_report(api_base, api_key, series_filter=None, verbose=False, workers=8, cross_check=False):
+    series_list = get(api_base, api_key, 'series')
+    if series_filter:
+        wanted = series_filter.lower()
+        series_list = [s for s in series_list if wanted in series_title(s).lower()]
+
+    # par défaut : taille et nombre de fichiers tirés de s['statistics'], aucun appel de plus ;
+    # seules les séries sans statistics (vieux serveurs) passent par /episodefile + /episode
+    if cross_check:
+        detailed = series_list
+        report = []
+    else:
+        detailed = [s for s in series_list if not s.get('statistics')]
+        report = [stats_report(s) for s in series_list if s.get('statistics')]
+
+    if detailed:
+        # les appels API par série sont indépendants : on les parallélise
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+            report.extend(ex.map(lambda s: series_report(api_base, api_key, s, verbose), detailed))
+        if cross_check and verbose:
+            by_id = {s.get('id'): s for s in series_list}
+            for r in report:
+                if not by_id[r['seriesId']].get('statistics'):
+                    continue
+                st = stats_report(by_id[r['seriesId']])
+                if (st['total_bytes'], st['downloaded_episodes']) != (r['total_bytes'], r['downloaded_episodes']):
+                    print(f"[CHECK] {r['title']}: statistics={st['downloaded_episodes']} fichiers / "
+                          f"{bytes_to_human(st['total_bytes'])}, détail={r['downloaded_episodes']} épisodes / "
+                          f"{bytes_to_human(r['total_bytes'])}", file=sys.stderr)
 
     # sort by avg bytes per episode desc (pire -> meilleur)
-    report.sort(key=lambda x: x['avg_bytes_per_episode'], reverse=True)
+    report.sort(key=itemgetter('avg_bytes_per_episode'), reverse=True)
     return report
 
 def print_report(report, top=None):
@@ -133,10 +216,22 @@ def main():
     p.add_argument('--out-file', help='Chemin du fichier de sortie (par défaut report.csv/report.json)')
     p.add_argument('--top', type=int, help='Afficher seulement les N premiers')
     p.add_argument('--filter', help='Filtrer les séries par substring dans le titre')
+    p.add_argument('--cache-ttl', type=int, default=0,
+                   help='Mettre en cache les réponses API N secondes (nécessite requests-cache)')
+    p.add_argument('--workers', type=int, default=8,
+                   help='Nombre de séries interrogées en parallèle (avec --cross-check)')
+    p.add_argument('--cross-check', action='store_true',
+                   help="Compter via /episodefile et /episode série par série (2 appels par série) "
+                        "au lieu des statistics de /series ; écarts affichés avec --verbose")
     p.add_argument('--verbose', action='store_true')
     args = p.parse_args()
 
-    report = build_report(args.url, args.api_key, series_filter=args.filter, verbose=args.verbose)
+    if args.cache_ttl > 0:
+        enable_http_cache(args.cache_ttl)
+    set_pool_size(args.workers)
+
+    report = build_report(args.url, args.api_key, series_filter=args.filter, verbose=args.verbose,
+                          workers=args.workers, cross_check=args.cross_check)
     print_report(report, top=args.top)
 
     if args.out != 'none':
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
-import os, sys, argparse, logging, json
+import os, sys, argparse, logging, json, math, hashlib, sqlite3
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from functools import lru_cache
+from contextlib import closing
 
 # permettre "import cleaner.*"
 ROOT = os.path.dirname(os.path.abspath(__file__))
@@ -9,16 +12,29 @@ ROOT = os.path.dirname(ROOT)
 sys.path.insert(0, ROOT)
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    # JSON plus rapide si orjson est installé (optionnel)
+    import orjson
+except ImportError:
+    orjson = None
 
 from cleaner.config import (
     SONARR_URL, SONARR_KEY, RADARR_URL, RADARR_KEY,
     QBIT_HOST, QBIT_USER, QBIT_PASS,
     HIST_PAGE_SIZE, HIST_MAX_PAGES
 )
-from cleaner.http import json_get
 
+# CATALOG_FILE=.../catalog.db : stockage SQLite (une ligne par série / film, seules
+# les entrées modifiées sont réécrites) au lieu du catalog.json réécrit en entier
 CATALOG_PATH = os.environ.get("CATALOG_FILE", os.path.join(ROOT, "data", "catalog.json"))
 REQ_TIMEOUT = 20
+HIST_WORKERS = 4  # pages d'historique récupérées en parallèle
+# erreurs transitoires (429/5xx, coupures) : nouvelles tentatives avec backoff exponentiel
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 1.0
 
 log = logging.getLogger("catalog-builder")
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
@@ -27,7 +43,9 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(mes
 def iso(dt: datetime) -> str:
     return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
 
+@lru_cache(maxsize=100_000)
 def parse_dt(iso_s: str) -> datetime:
+    # mémoïsé : dates répétées entre événements et max_event_at relu à chaque fusion
     try:
         return datetime.fromisoformat((iso_s or "").replace("Z", "+00:00"))
     except Exception:
@@ -43,70 +61,209 @@ def qb_login(sess: requests.Session):
 def qb_all_torrents(sess: requests.Session) -> list[dict]:
     r = sess.get(f"{QBIT_HOST}/api/v2/torrents/info", timeout=REQ_TIMEOUT)
     r.raise_for_status()
-    return r.json()
-
-def sonarr_history_pages(max_pages: int):
-    page = 1
-    while page <= max_pages:
-        payload = json_get(f"{SONARR_URL}/api/v3/history",
-                           headers={"X-Api-Key": SONARR_KEY},
-                           params={
-                               "includeEpisode": "true",
-                               "page": page, "pageSize": HIST_PAGE_SIZE,
-                               "sortKey": "date", "sortDirection": "descending"
-                           })
-        recs = payload.get("records", payload) or []
-        if not recs: break
-        yield recs
-        total = payload.get("totalRecords")
-        if total is not None and page * HIST_PAGE_SIZE >= total: break
-        page += 1
-
-def radarr_history_pages(max_pages: int):
-    page = 1
-    while page <= max_pages:
-        payload = json_get(f"{RADARR_URL}/api/v3/history",
-                           headers={"X-Api-Key": RADARR_KEY},
-                           params={
-                               "includeMovie": "true",
-                               "page": page, "pageSize": HIST_PAGE_SIZE,
-                               "sortKey": "date", "sortDirection": "descending"
-                           })
+    return orjson.loads(r.content) if orjson else r.json()
+
+# types d'événements pertinents (comparés en minuscules)
+_REL_SONARR = frozenset({"grabbed","grab","download","downloadimported","episodefileimported","upgrade","downloadfolderimported"})
+_REL_RADARR = frozenset({"grabbed","grab","download","moviefileimported","downloadfolderimported","upgrade"})
+
+def make_session() -> requests.Session:
+    # session keep-alive ; pool >= HIST_WORKERS pour les pages d'historique parallèles
+    sess = requests.Session()
+    retry = Retry(total=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset({"GET", "POST"}))
+    adapter = HTTPAdapter(pool_maxsize=HIST_WORKERS, max_retries=retry)
+    sess.mount("http://", adapter)
+    sess.mount("https://", adapter)
+    return sess
+
+def history_pages(sess: requests.Session, base_url: str, api_key: str, include: str, max_pages: int,
+                  watermark: datetime | None = None, keep: frozenset | None = None):
+    """Pages d'historique *arr (tri DESC) : page 1, puis les suivantes en parallèle via totalRecords.
+
+    Si `keep` est donné, seuls les événements dont le type (minuscule) y figure sont
+    conservés, dès la réception de la page : les pages en attente ne gardent pas les autres.
+    Si `watermark` est donné (date du dernier événement déjà catalogué), la pagination
+    s'arrête après la première page dont l'événement le plus ancien est <= watermark.
+    """
+    headers = {"X-Api-Key": api_key, "Accept": "application/json",
+               "Accept-Encoding": "gzip, deflate"}
+
+    def fetch(page: int):
+        """(totalRecords, événements conservés ou None si page vide, watermark atteint)"""
+        r = sess.get(f"{base_url}/api/v3/history", headers=headers,
+                     params={
+                         include: "true",
+                         "page": page, "pageSize": HIST_PAGE_SIZE,
+                         "sortKey": "date", "sortDirection": "descending"
+                     },
+                     timeout=REQ_TIMEOUT)
+        r.raise_for_status()
+        payload = orjson.loads(r.content) if orjson else r.json()
         recs = payload.get("records", payload) or []
-        if not recs: break
-        yield recs
-        total = payload.get("totalRecords")
-        if total is not None and page * HIST_PAGE_SIZE >= total: break
-        page += 1
+        if not recs:
+            return payload.get("totalRecords"), None, True
+        reached = watermark is not None and min(parse_dt(it.get("date")) for it in recs) <= watermark
+        if keep is not None:
+            recs = [it for it in recs if (it.get("eventType") or "").lower() in keep]
+        return payload.get("totalRecords"), recs, reached
+
+    total, recs, reached = fetch(1)
+    if recs is None: return
+    if recs: yield recs
+    if reached: return
+    if total is None:
+        # pas de totalRecords : pagination séquentielle
+        page = 2
+        while page <= max_pages:
+            _, recs, reached = fetch(page)
+            if recs is None: break
+            if recs: yield recs
+            if reached: break
+            page += 1
+        return
+    last_page = min(max_pages, math.ceil(total / HIST_PAGE_SIZE))
+    if last_page < 2: return
+    ex = ThreadPoolExecutor(max_workers=HIST_WORKERS)
+    try:
+        for _, recs, reached in ex.map(fetch, range(2, last_page + 1)):
+            if recs is None: break
+            if recs: yield recs
+            if reached: break
+    finally:
+        # arrêt anticipé : les pages pas encore demandées sont annulées
+        ex.shutdown(wait=True, cancel_futures=True)
 
-def is_rel_sonarr(ev: str) -> bool:
-    ev = (ev or "").lower()
-    return ev in ("grabbed","grab","download","downloadimported","episodefileimported","upgrade","downloadfolderimported")
+def sonarr_history_pages(sess: requests.Session, max_pages: int, watermark: datetime | None = None):
+    return history_pages(sess, SONARR_URL, SONARR_KEY, "includeEpisode", max_pages, watermark, _REL_SONARR)
 
-def is_rel_radarr(ev: str) -> bool:
-    ev = (ev or "").lower()
-    return ev in ("grabbed","grab","download","moviefileimported","downloadfolderimported","upgrade")
+def radarr_history_pages(sess: requests.Session, max_pages: int, watermark: datetime | None = None):
+    return history_pages(sess, RADARR_URL, RADARR_KEY, "includeMovie", max_pages, watermark, _REL_RADARR)
+
+def last_event_at(catalog: dict, app: str) -> datetime | None:
+    """Watermark stocké dans meta.<app>.last_event_at lors de la précédente construction."""
+    s = ((catalog.get("meta") or {}).get(app) or {}).get("last_event_at")
+    return parse_dt(s) if s else None
 
 def ensure_dir(p: str):
     d = os.path.dirname(p)
     if d and not os.path.isdir(d):
         os.makedirs(d, exist_ok=True)
 
+def is_sqlite_catalog(path: str) -> bool:
+    return path.endswith((".db", ".sqlite", ".sqlite3"))
+
+def _dumps(obj) -> str:
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode() if orjson else json.dumps(obj, ensure_ascii=False)
+
+def _loads(s: str):
+    return orjson.loads(s) if orjson else json.loads(s)
+
+def open_catalog_db(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS entries ("
+                 "kind TEXT NOT NULL, key TEXT NOT NULL, json TEXT NOT NULL, "
+                 "PRIMARY KEY (kind, key))")
+    return conn
+
+def load_catalog_db(path: str) -> dict:
+    """Même structure que catalog.json : kind "sonarr"/"radarr" -> clé, kind "meta" -> clé ""."""
+    cat = {"sonarr": {}, "radarr": {}, "meta": {}}
+    ensure_dir(path)
+    with closing(open_catalog_db(path)) as conn:
+        for kind, key, data in conn.execute("SELECT kind, key, json FROM entries"):
+            if kind == "meta":
+                cat["meta"] = _loads(data)
+            else:
+                cat.setdefault(kind, {})[key] = _loads(data)
+    return cat
+
+def save_catalog_db(cat: dict, path: str, dirty: set | None = None):
+    """INSERT OR REPLACE des seules entrées (kind, key) de `dirty` (toutes si None) + meta."""
+    if dirty is None:
+        dirty = {(kind, key) for kind in ("sonarr", "radarr") for key in cat.get(kind, {})}
+    rows = [(kind, key, _dumps(cat[kind][key])) for kind, key in dirty]
+    rows.append(("meta", "", _dumps(cat.get("meta") or {})))
+    with closing(open_catalog_db(path)) as conn, conn:
+        conn.executemany("INSERT OR REPLACE INTO entries (kind, key, json) VALUES (?, ?, ?)", rows)
+
 def load_catalog(path: str) -> dict:
+    if is_sqlite_catalog(path):
+        return load_catalog_db(path)
     try:
+        if orjson:
+            with open(path, "rb") as f:
+                return orjson.loads(f.read())
         with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
     except Exception:
         return {"sonarr": {}, "radarr": {}, "meta": {}}
 
-def save_catalog(cat: dict, path: str):
+def catalog_digest(cat: dict) -> str:
+    # empreinte du contenu hors meta.built_at (qui change à chaque exécution)
+    meta = {k: v for k, v in (cat.get("meta") or {}).items() if k != "built_at"}
+    view = {**cat, "meta": meta}
+    if orjson:
+        payload = orjson.dumps(view, option=orjson.OPT_NON_STR_KEYS)
+    else:
+        payload = json.dumps(view, ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+def save_catalog(cat: dict, path: str, dirty: set | None = None) -> bool:
+    """Écrit le catalogue (tmp + fsync + os.replace). Retourne False si le contenu
+    est identique à la dernière écriture (empreinte dans <path>.hash) : rien n'est réécrit.
+    En SQLite, seules les entrées `dirty` (kind, key) sont écrites."""
     ensure_dir(path)
+    if is_sqlite_catalog(path):
+        save_catalog_db(cat, path, dirty)
+        return True
+    hash_path = path + ".hash"
+    digest = catalog_digest(cat)
+    try:
+        with open(hash_path, "r", encoding="ascii") as f:
+            if f.read().strip() == digest and os.path.isfile(path):
+                return False
+    except OSError:
+        pass
+
     tmp = path + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(cat, f, ensure_ascii=False, indent=2)
+    if orjson:
+        # un seul bytes, une seule écriture
+        with open(tmp, "wb") as f:
+            f.write(orjson.dumps(cat, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+            f.flush()
+            os.fsync(f.fileno())
+    else:
+        # gros tampon : les petites écritures de l'encodeur json sont regroupées
+        with open(tmp, "w", encoding="utf-8", buffering=1 << 20) as f:
+            json.dump(cat, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
     os.replace(tmp, path)
+    with open(hash_path, "w", encoding="ascii") as f:
+        f.write(digest)
+    return True
 
 # ---------- merge helpers ----------
+def add_candidate(entry: dict, cur: str):
+    # set associé à la liste (construit une fois par entrée) : test d'appartenance O(1)
+    # tout en gardant l'ordre d'insertion de "candidates" ; retiré avant l'écriture
+    cand_set = entry.get("_cand_set")
+    if cand_set is None:
+        cand_set = entry["_cand_set"] = set(entry["candidates"])
+    if cur and cur not in cand_set:
+        cand_set.add(cur)
+        entry["candidates"].append(cur)
+
+def strip_cand_sets(catalog: dict):
+    for series in catalog.get("sonarr", {}).values():
+        for entry in series.get("episodes", {}).values():
+            entry.pop("_cand_set", None)
+    for entry in catalog.get("radarr", {}).values():
+        entry.pop("_cand_set", None)
+
 def merge_episode(entry: dict, add_hash: str, event_dt: datetime, title: str | None, season: int | None, epnum: int | None):
     entry.setdefault("season", season)
     entry.setdefault("episode", epnum)
@@ -114,9 +271,8 @@ def merge_episode(entry: dict, add_hash: str, event_dt: datetime, title: str | N
     entry.setdefault("candidates", [])
     entry.setdefault("removed", [])
     entry.setdefault("latest", None)
-    cur = (add_hash or "").lower().strip()
-    if cur and cur not in entry["candidates"]:
-        entry["candidates"].append(cur)
+    cur = add_hash or ""   # déjà normalisé (minuscules, sans espaces) par l'appelant
+    add_candidate(entry, cur)
     # latest = plus récent (on ne garde pas la date individuelle, seulement la max globale)
     max_prev = parse_dt(entry.get("max_event_at") or "1970-01-01T00:00:00Z")
     if event_dt > max_prev:
@@ -129,34 +285,64 @@ def merge_movie(entry: dict, add_hash: str, event_dt: datetime, title: str | Non
     entry.setdefault("candidates", [])
     entry.setdefault("removed", [])
     entry.setdefault("latest", None)
-    cur = (add_hash or "").lower().strip()
-    if cur and cur not in entry["candidates"]:
-        entry["candidates"].append(cur)
+    cur = add_hash or ""   # déjà normalisé (minuscules, sans espaces) par l'appelant
+    add_candidate(entry, cur)
     max_prev = parse_dt(entry.get("max_event_at") or "1970-01-01T00:00:00Z")
     if event_dt > max_prev:
         entry["max_event_at"] = iso(event_dt)
         entry["latest"] = cur or entry["latest"]
 
 # ---------- build ----------
-def build_catalog(pages_sonarr: int, pages_radarr: int, qb_only: bool):
-    # 1) qB (optionnel pour filtrer)
-    with requests.Session() as sess:
-        log.info("Connexion qBittorrent…")
-        qb_login(sess)
-        qbt = qb_all_torrents(sess)
+def build_catalog(pages_sonarr: int, pages_radarr: int, qb_only: bool, full: bool = False):
+    # 1) charger existant (merge, pas overwrite)
+    catalog = load_catalog(CATALOG_PATH)
+    # watermarks : événements les plus récents déjà vus (ignorés avec --full)
+    wm_sonarr = None if full else last_event_at(catalog, "sonarr")
+    wm_radarr = None if full else last_event_at(catalog, "radarr")
+    newest_sonarr, newest_radarr = wm_sonarr, wm_radarr
+    dirty: set[tuple[str, str]] = set()  # entrées touchées (réécrites seules en SQLite)
+    sonarr_on = bool(SONARR_URL and SONARR_KEY)
+    radarr_on = bool(RADARR_URL and RADARR_KEY)
+
+    # 2) qB (optionnel pour filtrer), historiques Sonarr et Radarr : serveurs indépendants,
+    # récupérés en parallèle (une session keep-alive par tâche) ; la fusion reste séquentielle
+    def fetch_qb() -> list[dict]:
+        with make_session() as sess:
+            log.info("Connexion qBittorrent…")
+            qb_login(sess)
+            return qb_all_torrents(sess)
+
+    def fetch_history(pages_fn, max_pages: int, watermark: datetime | None) -> list[list[dict]]:
+        with make_session() as sess:
+            return list(pages_fn(sess, max(1, max_pages), watermark))
+
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        f_qb = ex.submit(fetch_qb)
+        if sonarr_on:
+            log.info(f"Scan Sonarr: {pages_sonarr} pages…")
+            if wm_sonarr:
+                log.info(f"Sonarr: arrêt au watermark {iso(wm_sonarr)}")
+            f_sonarr = ex.submit(fetch_history, sonarr_history_pages, pages_sonarr, wm_sonarr)
+        if radarr_on:
+            log.info(f"Scan Radarr: {pages_radarr} pages…")
+            if wm_radarr:
+                log.info(f"Radarr: arrêt au watermark {iso(wm_radarr)}")
+            f_radarr = ex.submit(fetch_history, radarr_history_pages, pages_radarr, wm_radarr)
+        qbt = f_qb.result()
     qb_hashes = { (t.get("hash") or "").lower(): t for t in qbt }
     log.info(f"qB: {len(qb_hashes)} torrents chargés.")
 
-    # 2) charger existant (merge, pas overwrite)
-    catalog = load_catalog(CATALOG_PATH)
-
     # 3) SONARR
-    if SONARR_URL and SONARR_KEY:
+    if sonarr_on:
         total_events = 0
-        log.info(f"Scan Sonarr: {pages_sonarr} pages…")
-        for recs in sonarr_history_pages(max(1, pages_sonarr)):
-            for it in recs:
-                if not is_rel_sonarr(it.get("eventType")): continue
+        for recs in f_sonarr.result():
+            # tri DESC : le premier événement (pertinent) de chaque page est le plus récent.
+            # --qb-only ignore des événements (hash absent de qB) : le watermark n'avance pas,
+            # sinon ils ne seraient plus jamais relus sans --full
+            if not qb_only:
+                d = parse_dt(recs[0].get("date"))
+                if newest_sonarr is None or d > newest_sonarr: newest_sonarr = d
+            for it in recs:  # déjà filtrés sur _REL_SONARR
                 dl = (it.get("downloadId") or "").lower().strip()
                 if qb_only and (not dl or dl not in qb_hashes): continue
 
@@ -166,6 +352,7 @@ def build_catalog(pages_sonarr: int, pages_radarr: int, qb_only: bool):
                 if not (series_id and eid): continue
 
                 event_dt = parse_dt(it.get("date"))
+                dirty.add(("sonarr", str(series_id)))
                 series_entry = catalog["sonarr"].setdefault(str(series_id), {"seriesTitle": series.get("title"), "episodes": {}})
                 epi_entry = series_entry["episodes"].setdefault(str(eid), {})
                 merge_episode(
@@ -180,12 +367,13 @@ def build_catalog(pages_sonarr: int, pages_radarr: int, qb_only: bool):
         log.info("Sonarr désactivé (URL/API KEY manquants).")
 
     # 4) RADARR
-    if RADARR_URL and RADARR_KEY:
+    if radarr_on:
         total_events = 0
-        log.info(f"Scan Radarr: {pages_radarr} pages…")
-        for recs in radarr_history_pages(max(1, pages_radarr)):
-            for it in recs:
-                if not is_rel_radarr(it.get("eventType")): continue
+        for recs in f_radarr.result():
+            if not qb_only:  # cf. Sonarr : pas d'avancée du watermark en --qb-only
+                d = parse_dt(recs[0].get("date"))
+                if newest_radarr is None or d > newest_radarr: newest_radarr = d
+            for it in recs:  # déjà filtrés sur _REL_RADARR
                 dl = (it.get("downloadId") or "").lower().strip()
                 if qb_only and (not dl or dl not in qb_hashes): continue
 
@@ -194,6 +382,7 @@ def build_catalog(pages_sonarr: int, pages_radarr: int, qb_only: bool):
                 if not mid: continue
 
                 event_dt = parse_dt(it.get("date"))
+                dirty.add(("radarr", str(mid)))
                 mov_entry = catalog["radarr"].setdefault(str(mid), {})
                 merge_movie(
                     mov_entry, dl, event_dt,
@@ -210,10 +399,17 @@ def build_catalog(pages_sonarr: int, pages_radarr: int, qb_only: bool):
     catalog["meta"]["source"] = "build_catalog"
     catalog["meta"]["sonarr"] = {"pages_scanned": pages_sonarr}
     catalog["meta"]["radarr"] = {"pages_scanned": pages_radarr}
+    if newest_sonarr:
+        catalog["meta"]["sonarr"]["last_event_at"] = iso(newest_sonarr)
+    if newest_radarr:
+        catalog["meta"]["radarr"]["last_event_at"] = iso(newest_radarr)
 
+    strip_cand_sets(catalog)
     ensure_dir(CATALOG_PATH)
-    save_catalog(catalog, CATALOG_PATH)
-    log.info(f"Catalogue écrit → {CATALOG_PATH}")
+    if save_catalog(catalog, CATALOG_PATH, dirty):
+        log.info(f"Catalogue écrit → {CATALOG_PATH}")
+    else:
+        log.info(f"Catalogue inchangé, non réécrit → {CATALOG_PATH}")
     log.info("Terminé ✅")
 
 
@@ -226,8 +422,10 @@ def main():
                     help="Pages d'historique Radarr à scanner (tri DESC).")
     ap.add_argument("--qb-only", action="store_true",
                     help="Ne catalogue que les hashes présents actuellement dans qBittorrent.")
+    ap.add_argument("--full", action="store_true",
+                    help="Ignore le watermark last_event_at et rescanne toutes les pages demandées.")
     args = ap.parse_args()
-    build_catalog(args.pages_sonarr, args.pages_radarr, args.qb_only)
+    build_catalog(args.pages_sonarr, args.pages_radarr, args.qb_only, args.full)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+qb_api.py
+Small qBittorrent WebUI client shared by relocated-torrent.py and remove-tag.py.
+
+One QbClient = one logged-in Session with a pooled keep-alive adapter and
+retries on transient errors, so a caller chaining both restore steps
+(setLocation + recheck, then tag removal) logs in once and reuses the pool.
+
+Usage:
+  from qb_api import QbClient
+  qb = QbClient("http://127.0.0.1:8080")
+  qb.login("admin", "adminadmin")
+  torrents = qb.torrents_by_tag("restore")
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from functools import lru_cache
+from urllib.parse import quote_plus
+from typing import Any, Dict, Iterable, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    # orjson (optional) decodes large torrents/info payloads much faster than stdlib json
+    import orjson
+except ImportError:
+    orjson = None
+
+TIMEOUT = 15.0
+LOGIN_TIMEOUT = 10.0
+HTTP_POOL_SIZE = 16  # connexions keep-alive conservées vers la WebUI
+# erreurs transitoires (429/5xx, coupures) : nouvelles tentatives avec backoff exponentiel
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 1.0
+
+def make_session(pool_size: int = HTTP_POOL_SIZE) -> requests.Session:
+    # keep-alive : la connexion ouverte au login est réutilisée par tous les appels suivants
+    s = requests.Session()
+    # setLocation/recheck/removeTags sont idempotents : POST peut être rejoué sans risque
+    retry = Retry(total=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset({"GET", "POST"}))
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    # torrents/info compresse très bien (noms de champs répétés) : réponse gzip demandée
+    s.headers.update({"Accept-Encoding": "gzip, deflate"})
+    return s
+
+def json_of(r: requests.Response):
+    return orjson.loads(r.content) if orjson else r.json()
+
+FORM_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+
+@lru_cache(maxsize=None)
+def form_field(name: str, value: str) -> str:
+    """name=value form-encoded; cached, for fields repeated identically across batches."""
+    return f"{name}={quote_plus(value)}"
+
+def join_hashes(hashes) -> str:
+    """qBittorrent separates several hashes with "|"."""
+    return "|".join(hashes) if isinstance(hashes, (list, tuple)) else hashes
+
+@dataclass
+class QbClient:
+    host: str
+    pool_size: int = HTTP_POOL_SIZE
+    timeout: float = TIMEOUT
+    session: requests.Session = field(init=False, repr=False)
+    api: str = field(init=False, repr=False)
+
+    def __post_init__(self):
+        # base URL cleaned once; every endpoint URL is built from it
+        self.host = self.host.rstrip("/")
+        self.api = f"{self.host}/api/v2"
+        self.session = make_session(self.pool_size)
+
+    def url(self, endpoint: str) -> str:
+        return f"{self.api}/{endpoint}"
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self) -> QbClient:
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------------- auth ----------------
+    def login(self, user: str, password: str):
+        try:
+            r = self.session.post(self.url("auth/login"), data={"username": user, "password": password},
+                                  timeout=LOGIN_TIMEOUT)
+        except requests.RequestException as e:
+            raise RuntimeError(f"HTTP error during login: {e}")
+        if r.status_code != 200 or "SID" not in self.session.cookies.get_dict():
+            raise RuntimeError(f"qBittorrent login failed: HTTP {r.status_code} - {r.text[:200]}")
+
+    # ---------------- read ----------------
+    def torrents(self, category: Optional[str] = None, tag: Optional[str] = None) -> List[Dict[str, Any]]:
+        params = {}
+        if category:
+            params["category"] = category
+        if tag:
+            params["tag"] = tag  # server-side filter (qBittorrent >= 4.3, exact tag name)
+        r = self.session.get(self.url("torrents/info"), params=params, timeout=self.timeout)
+        r.raise_for_status()
+        return json_of(r)
+
+    def tags(self) -> List[str]:
+        r = self.session.get(self.url("torrents/tags"), timeout=self.timeout)
+        r.raise_for_status()
+        return json_of(r)
+
+    def torrents_by_tag(self, tag: str, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Torrents carrying `tag` (case-insensitive), filtered by qBittorrent itself.
+        The server filter is exact, so the tag's real spelling(s) are resolved first;
+        if /torrents/tags is unavailable, fall back to the full listing.
+        """
+        wanted = tag.lower()
+        try:
+            names = [n for n in self.tags() if n.lower() == wanted]
+        except requests.RequestException:
+            return self.torrents(category=category)
+        torrents: Dict[str, Dict[str, Any]] = {}
+        for name in names:
+            for t in self.torrents(category=category, tag=name):
+                torrents.setdefault(t.get("hash"), t)
+        return list(torrents.values())
+
+    def info(self, hashes: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """One /torrents/info call for several hashes -> map hash_upper -> torrent."""
+        # POST: long hash lists do not hit URL length limits
+        r = self.session.post(self.url("torrents/info"), data={"hashes": "|".join(hashes)}, timeout=self.timeout)
+        r.raise_for_status()
+        return {(t.get("hash") or "").upper(): t for t in json_of(r)}
+
+    # ---------------- write ----------------
+    def set_location(self, hashes, location: str) -> str:
+        r = self.session.post(self.url("torrents/setLocation"),
+                              data={"hashes": join_hashes(hashes), "location": location}, timeout=self.timeout)
+        r.raise_for_status()
+        return r.text
+
+    def recheck(self, hashes) -> str:
+        r = self.session.post(self.url("torrents/recheck"), data={"hashes": join_hashes(hashes)}, timeout=self.timeout)
+        r.raise_for_status()
+        return r.text
+
+    def remove_tags(self, hashes, tags: List[str]) -> None:
+        """hashes joined with "|", tag names joined with ","."""
+        # body encoded by hand: the tags field is the same for every batch and is encoded once
+        body = f"hashes={quote_plus(join_hashes(hashes))}&{form_field('tags', ','.join(tags))}"
+        r = self.session.post(self.url("torrents/removeTags"), data=body, headers=FORM_HEADERS,
+                              timeout=self.timeout)
+        r.raise_for_status()
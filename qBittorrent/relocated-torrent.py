@@ -6,12 +6,14 @@ qb_restore_setlocation_from_radarrlist.py
 Variant of qb_restore_setlocation_only.py that accepts input JSON in two forms:
  - old Radarr-like mapping: { "<key>": { "lastHash": "...", "folder": "...", ... }, ... }
  - new list form: [ { "radarr_id": 517, "title": "...", "folder": "...", "mkv_file": "...", "torrent_hash": "..." }, ... ]
+ - JSONL variants of both (*.jsonl, one item per line)
 
 Behaviour:
  - For torrents filtered by tag (ex: "restore"), change only the save_path (setLocation -> folder from input JSON) then recheck.
  - No rename, no category/genre change.
  - DRY_RUN = True by default; use --apply to actually perform actions.
  - The loader will map by torrent hash (uppercase).
+ - qBittorrent calls go through qb_api.QbClient (same folder).
 
 Usage (dry-run):
   python3 qb_restore_setlocation_from_radarrlist.py -i radarr_export.json -t restore
@@ -22,12 +24,23 @@ Apply:
 from __future__ import annotations
 import argparse
 import json
+import mmap
 import sys
 import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, Any, List, Optional
 import os
-import requests
+from qb_api import QbClient
+
+try:
+    # faster JSON decoding/encoding when orjson is installed (optional)
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    json_loads = json.loads
 
 # =============================
 # SAFETY SWITCH (DEFAULT)
@@ -41,54 +54,46 @@ DEFAULT_QBT_HOST = os.environ.get("QBT_HOST", "http://127.0.0.1:8080")
 DEFAULT_QBT_USER = os.environ.get("QBT_USER", "admin")
 DEFAULT_QBT_PASS = os.environ.get("QBT_PASS", "adminadmin")
 
-SLEEP_AFTER_SETLOCATION = 0.2
-SLEEP_AFTER_RECHECK = 0.6
-TIMEOUT = 15.0
+# après le recheck : on interroge l'état jusqu'à voir la vérification démarrer (borné)
+RECHECK_POLL_TRIES = 10
+RECHECK_POLL_INTERVAL = 0.1
+CHECKING_STATES = ("checking", "queuedForChecking")  # checkingUP/DL/ResumeData, anciens noms
+APPLY_WORKERS = 16   # requêtes setLocation (une par dossier) envoyées en parallèle
+
+# au-delà, l'export est lu via mmap (avec orjson) au lieu d'être copié en mémoire
+MMAP_THRESHOLD = 50 * 1024 * 1024
 
 OUT_PLAN = Path("qb_restore_plan.json")
 OUT_RESULTS = Path("qb_restore_results_clean.json")
 
-# ---------------- qBittorrent API helpers ----------------
-def qb_login(s: requests.Session, host: str, user: str, password: str):
-    url = host.rstrip("/") + "/api/v2/auth/login"
-    try:
-        r = s.post(url, data={"username": user, "password": password}, timeout=10)
-    except requests.RequestException as e:
-        raise RuntimeError(f"HTTP error during login: {e}")
-    if r.status_code != 200 or "SID" not in s.cookies.get_dict():
-        raise RuntimeError(f"qBittorrent login failed: HTTP {r.status_code} - {r.text[:200]}")
-
-def qb_get_torrents(s: requests.Session, host: str, category: Optional[str]=None) -> List[Dict[str,Any]]:
-    url = host.rstrip("/") + "/api/v2/torrents/info"
-    params = {}
-    if category:
-        params["category"] = category
-    r = s.get(url, params=params, timeout=TIMEOUT)
-    r.raise_for_status()
-    return r.json()
-
-def qb_set_location(s: requests.Session, host: str, hashes, location: str):
-    url = host.rstrip("/") + "/api/v2/torrents/setLocation"
-    data = {"hashes": ",".join(hashes) if isinstance(hashes, (list,tuple)) else hashes, "location": location}
-    r = s.post(url, data=data, timeout=TIMEOUT)
-    r.raise_for_status()
-    return r.text
-
-def qb_recheck(s: requests.Session, host: str, hashes):
-    url = host.rstrip("/") + "/api/v2/torrents/recheck"
-    data = {"hashes": ",".join(hashes) if isinstance(hashes,(list,tuple)) else hashes}
-    r = s.post(url, data=data, timeout=TIMEOUT)
-    r.raise_for_status()
-    return r.text
-
-def qb_get_torrent_info(s: requests.Session, host: str, hash_: str) -> Optional[Dict[str,Any]]:
-    url = host.rstrip("/") + "/api/v2/torrents/info"
-    r = s.get(url, params={"hashes": hash_}, timeout=TIMEOUT)
-    r.raise_for_status()
-    arr = r.json()
-    return arr[0] if arr else None
-
 # ---------------- helpers for mapping & selection ----------------
+def load_jsonl(p: Path) -> List[Any]:
+    """
+    Read a JSONL export as a list of entries. A line is either an entry of
+    the list form or a { "<key>": {...} } item of the mapping form.
+    """
+    entries: List[Any] = []
+    # binary lines go straight to the decoder (no str decode step)
+    with p.open("rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            obj = json_loads(line)
+            if isinstance(obj, dict) and len(obj) == 1 and isinstance(next(iter(obj.values())), dict):
+                entries.extend(obj.values())
+            else:
+                entries.append(obj)
+    return entries
+
+def read_json_file(p: Path) -> Any:
+    """Decode a JSON file from bytes; big files are memory-mapped when orjson is available."""
+    if orjson and p.stat().st_size >= MMAP_THRESHOLD:
+        with p.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                return orjson.loads(view)
+    return json_loads(p.read_bytes())
+
 def load_input_json(p: Path) -> Dict[str, Dict[str,Any]]:
     """
     Load input JSON and return map hash_upper -> entry.
@@ -96,44 +101,61 @@ def load_input_json(p: Path) -> Dict[str, Dict[str,Any]]:
     Supports two input shapes:
       - mapping: { "<key>": { "lastHash": "...", "folder": "...", ... }, ... }
       - list: [ { "torrent_hash": "...", "folder": "...", ... }, ... ]
+    and their JSONL variants (*.jsonl, one mapping item or list entry per line).
     """
     if not p.exists():
         raise FileNotFoundError(f"Input JSON not found: {p}")
-    j = json.loads(p.read_text(encoding="utf-8"))
-
-    by_hash: Dict[str, Dict[str,Any]] = {}
+    if p.suffix.lower() == ".jsonl":
+        j = load_jsonl(p)
+    else:
+        j = read_json_file(p)
 
     if isinstance(j, dict):
-        # old mapping form: iterate values and use lastHash if present
-        for k, v in j.items():
-            if not isinstance(v, dict):
-                continue
-            # check possible fields
-            h = (v.get("lastHash") or v.get("torrent_hash") or v.get("torrentHash") or v.get("hash") or "").strip().upper()
-            if h:
-                by_hash[h] = v
-    elif isinstance(j, list):
+        # old mapping form: values, lastHash first
+        return {h: v for v in j.values() if isinstance(v, dict)
+                and (h := (v.get("lastHash") or v.get("torrent_hash") or v.get("torrentHash") or v.get("hash") or "").strip().upper())}
+    if isinstance(j, list):
         # new list form: each element should contain torrent_hash or hash
-        for v in j:
-            if not isinstance(v, dict):
-                continue
-            h = (v.get("torrent_hash") or v.get("lastHash") or v.get("hash") or "").strip().upper()
-            if h:
-                by_hash[h] = v
-    else:
-        raise ValueError("Unsupported JSON structure: expected object or list at top level")
-
-    return by_hash
+        return {h: v for v in j if isinstance(v, dict)
+                and (h := (v.get("torrent_hash") or v.get("lastHash") or v.get("hash") or "").strip().upper())}
+    raise ValueError("Unsupported JSON structure: expected object or list at top level")
 
-def parse_tags(tag_str: Optional[str]) -> List[str]:
-    if not tag_str:
-        return []
-    return [t.strip().lower() for t in tag_str.split(",") if t.strip()]
+def has_tag(tag_str: Optional[str], wanted: str) -> bool:
+    """`wanted` (already lower-cased) is one of the comma-separated tags."""
+    tags = (tag_str or "").lower()
+    # cheap substring test first; exact per-tag comparison only when it may match
+    return wanted in tags and any(t.strip() == wanted for t in tags.split(","))
 
 def dirname_of_path(p: Optional[str]) -> Optional[str]:
+    """Same result as str(Path(p).parent), with plain string slicing on the common case."""
     if not p:
         return None
-    return str(Path(p).parent)
+    if "//" in p or "/." in p or p.startswith("."):
+        # repeated slashes or "." components: let pathlib normalize
+        return str(Path(p).parent)
+    q = p.rstrip("/")
+    if not q:
+        return "/"
+    i = q.rfind("/")
+    if i < 0:
+        return "."
+    return q[:i] or "/"
+
+def write_json(p: Path, obj: Any):
+    """Write `obj` as indented UTF-8 JSON (same output as json.dumps(indent=2, ensure_ascii=False))."""
+    if orjson:
+        p.write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+    else:
+        p.write_text(json.dumps(obj, indent=2, ensure_ascii=False), encoding="utf-8")
+
+def target_folder_of(mapping: Dict[str,Any]) -> Optional[str]:
+    """Target folder of a mapped entry (only evaluated for torrents that have a mapping)."""
+    # Prefer mapping["folder"], fallback to dirname_of_path on common fields
+    target_folder = mapping.get("folder") or mapping.get("Folder") or dirname_of_path(mapping.get("importedFilePath") or mapping.get("moviefile_path") or mapping.get("movieFile") or mapping.get("mkv_file"))
+    # Defensive: if the mapping field points to a .mkv file, convert to parent folder
+    if target_folder and target_folder.lower().endswith(".mkv"):
+        target_folder = dirname_of_path(mapping.get("importedFilePath") or mapping.get("moviefile_path") or mapping.get("mkv_file"))
+    return target_folder
 
 # ---------------- main ----------------
 def main(argv=None):
@@ -166,27 +188,25 @@ def main(argv=None):
     if args.verbose:
         print(f"[VERB] Loaded {len(input_map)} mappings from {args.input}", file=sys.stderr)
 
-    # login to qBittorrent
-    s = requests.Session()
+    # login to qBittorrent (pooled keep-alive session with retries, see qb_api.py)
+    qb = QbClient(args.host, pool_size=APPLY_WORKERS)
     try:
-        qb_login(s, args.host, args.user, args.passw)
+        qb.login(args.user, args.passw)
     except Exception as e:
         print(f"[ERROR] qBittorrent login failed: {e}", file=sys.stderr)
         return 2
 
-    # fetch torrents (optionally filter by category at API level)
+    # fetch torrents (filtered by tag and optionally category at API level)
     try:
-        all_torrents = qb_get_torrents(s, args.host, category=args.category)
+        all_torrents = qb.torrents_by_tag(args.tag, category=args.category)
     except Exception as e:
         print(f"[ERROR] Cannot fetch torrents: {e}", file=sys.stderr)
         return 3
 
-    # filter by tag (client-side)
-    selected = []
-    for t in all_torrents:
-        tags = parse_tags(t.get("tags"))
-        if args.tag.lower() in tags:
-            selected.append(t)
+    # filter by tag (client-side): no-op check on the server-filtered list,
+    # real filter on old qBittorrent versions that ignore the "tag" parameter
+    wanted = args.tag.lower()
+    selected = [t for t in all_torrents if has_tag(t.get("tags"), wanted)]
 
     # Print number of found torrents (single integer on stdout)
     print(len(selected))
@@ -196,7 +216,7 @@ def main(argv=None):
 
     # Build actions: match selected torrents with input_map via torrent hash
     actions = []
-    for t in selected:
+    for t in (selected if input_map else ()):
         h = (t.get("hash") or "").strip().upper()
         if not h:
             if args.verbose:
@@ -207,18 +227,12 @@ def main(argv=None):
             if args.verbose:
                 print(f"[VERB] No mapping for hash {h} (torrent '{t.get('name')}')", file=sys.stderr)
             continue
-        # Prefer mapping["folder"], fallback to dirname_of_path on common fields
-        target_folder = mapping.get("folder") or mapping.get("Folder") or dirname_of_path(mapping.get("importedFilePath") or mapping.get("moviefile_path") or mapping.get("movieFile") or mapping.get("mkv_file"))
-        # Defensive: if the mapping field points to a .mkv file, convert to parent folder
-        if target_folder and target_folder.lower().endswith(".mkv"):
-            target_folder = dirname_of_path(mapping.get("importedFilePath") or mapping.get("moviefile_path") or mapping.get("mkv_file"))
-
         actions.append({
             "hash": h,
             "name": t.get("name"),
             "save_path": t.get("save_path") or t.get("savePath") or "",
             "state": t.get("state"),
-            "target_folder": target_folder,
+            "target_folder": target_folder_of(mapping),
             "mapping_raw": mapping
         })
 
@@ -248,7 +262,7 @@ def main(argv=None):
                 "to_folder": a["target_folder"],
                 "note": "DRY_RUN - no action performed"
             })
-        OUT_PLAN.write_text(json.dumps({"dry_run": True, "plan": plan}, indent=2, ensure_ascii=False), encoding="utf-8")
+        write_json(OUT_PLAN, {"dry_run": True, "plan": plan})
         if args.verbose:
             print(f"[VERB] Dry-run plan written to {OUT_PLAN}", file=sys.stderr)
         else:
@@ -265,61 +279,84 @@ def main(argv=None):
             print("[INFO] Aborted by user.", file=sys.stderr)
             return 0
 
-    # APPLY actions
+    # APPLY actions (batched: one setLocation per target folder, one recheck for all)
     results = []
+    by_folder: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
     for a in actions:
         h = a["hash"]
         tgt_folder = a["target_folder"]
         row: Dict[str, Any] = {"hash": h, "name": a["name"], "ok_setLocation": False, "ok_recheck": False, "state_after": None, "notes": []}
+        results.append(row)
 
         if not tgt_folder:
             row["notes"].append("no target_folder in mapping")
-            results.append(row)
             if args.verbose:
                 print(f"[WARN] skipping {h}: no target_folder", file=sys.stderr)
             continue
+        by_folder[tgt_folder].append(row)
 
-        # setLocation
+    # setLocation (one request per folder, folders in parallel: I/O bound)
+    def set_location(item):
+        tgt_folder, rows = item
+        hashes = [r["hash"] for r in rows]
         try:
             if args.verbose:
-                print(f"[ACTION] setLocation {h} -> {tgt_folder}", file=sys.stderr)
-            qb_set_location(s, args.host, h, tgt_folder)
-            row["ok_setLocation"] = True
-            time.sleep(SLEEP_AFTER_SETLOCATION)
+                print(f"[ACTION] setLocation {len(hashes)} torrent(s) -> {tgt_folder}", file=sys.stderr)
+            qb.set_location(hashes, tgt_folder)
         except Exception as e:
-            row["notes"].append(f"setLocation failed: {e}")
-            results.append(row)
+            for r in rows:
+                r["notes"].append(f"setLocation failed: {e}")
             if args.verbose:
-                print(f"[ERR] setLocation failed for {h}: {e}", file=sys.stderr)
-            continue
-
-        # recheck
+                print(f"[ERR] setLocation failed for {', '.join(hashes)}: {e}", file=sys.stderr)
+            return
+        for r in rows:
+            r["ok_setLocation"] = True
+
+    with ThreadPoolExecutor(max_workers=APPLY_WORKERS) as ex:
+        list(ex.map(set_location, by_folder.items()))
+    relocated = [r for r in results if r["ok_setLocation"]]
+
+    # recheck
+    if relocated:
+        hashes = [r["hash"] for r in relocated]
         try:
             if args.verbose:
-                print(f"[ACTION] recheck {h}", file=sys.stderr)
-            qb_recheck(s, args.host, h)
-            row["ok_recheck"] = True
+                print(f"[ACTION] recheck {len(hashes)} torrent(s)", file=sys.stderr)
+            qb.recheck(hashes)
+            for r in relocated:
+                r["ok_recheck"] = True
         except Exception as e:
-            row["notes"].append(f"recheck failed: {e}")
-            results.append(row)
+            for r in relocated:
+                r["notes"].append(f"recheck failed: {e}")
             if args.verbose:
-                print(f"[ERR] recheck failed for {h}: {e}", file=sys.stderr)
-            continue
+                print(f"[ERR] recheck failed: {e}", file=sys.stderr)
+            relocated = []
 
-        # wait and fetch state after recheck
-        time.sleep(SLEEP_AFTER_RECHECK)
-        try:
-            tinfo = qb_get_torrent_info(s, args.host, h)
-            row["state_after"] = tinfo.get("state") if tinfo else None
-        except Exception as e:
+    # wait and fetch state after recheck:
+    # one bulk /torrents/info per poll round, only for torrents not yet seen checking
+    pending = relocated
+    try:
+        for attempt in range(RECHECK_POLL_TRIES):
+            if not pending:
+                break
+            if attempt:
+                time.sleep(RECHECK_POLL_INTERVAL)
+            infos = qb.info(r["hash"] for r in pending)
+            still = []
+            for row in pending:
+                tinfo = infos.get(row["hash"])
+                row["state_after"] = tinfo.get("state") if tinfo else None
+                if not (row["state_after"] or "").startswith(CHECKING_STATES):
+                    still.append(row)
+            pending = still
+    except Exception as e:
+        for row in pending:
             row["notes"].append(f"fetch info after recheck failed: {e}")
-            if args.verbose:
-                print(f"[WARN] cannot fetch torrent info after recheck for {h}: {e}", file=sys.stderr)
-
-        results.append(row)
+        if args.verbose:
+            print(f"[WARN] cannot fetch torrent info after recheck: {e}", file=sys.stderr)
 
     # Save results
-    OUT_RESULTS.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+    write_json(OUT_RESULTS, results)
     if args.verbose:
         print(f"[VERB] Apply results written to {OUT_RESULTS}", file=sys.stderr)
     else:
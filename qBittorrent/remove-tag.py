@@ -3,6 +3,7 @@
 """
 qb_clear_restore_tag.py
 Find all torrents with tag 'restore' and remove that tag.
+qBittorrent calls go through qb_api.QbClient (same folder).
 
 Usage (dry-run):
   python3 qb_clear_restore_tag.py --host http://127.0.0.1:8080 --user admin --passw adminadmin
@@ -14,46 +15,19 @@ from __future__ import annotations
 import argparse
 import sys
 import json
-import requests
 import os
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+from typing import List, Optional
+from qb_api import QbClient
 
 # Defaults (env override possible)
 DEFAULT_QBT_HOST = os.environ.get("QBT_HOST", "http://127.0.0.1:8080")
 DEFAULT_QBT_USER = os.environ.get("QBT_USER", "admin")
 DEFAULT_QBT_PASS = os.environ.get("QBT_PASS", "adminadmin")
 
-TIMEOUT = 15.0
-
-# ---------------- qBittorrent API helpers ----------------
-def qb_login(s: requests.Session, host: str, user: str, password: str):
-    url = host.rstrip("/") + "/api/v2/auth/login"
-    r = s.post(url, data={"username": user, "password": password}, timeout=10)
-    r.raise_for_status()
-    # success if cookie present
-    if "SID" not in s.cookies.get_dict():
-        raise RuntimeError(f"login failed: no session cookie returned (HTTP {r.status_code})")
-
-def qb_get_torrents(s: requests.Session, host: str) -> List[Dict[str, Any]]:
-    url = host.rstrip("/") + "/api/v2/torrents/info"
-    r = s.get(url, timeout=TIMEOUT)
-    r.raise_for_status()
-    return r.json()
-
-def qb_remove_tags(s: requests.Session, host: str, hashes: List[str], tags: List[str]) -> None:
-    """
-    Call /api/v2/torrents/removeTags with hashes and tags.
-    hashes: list of torrent hashes (will be joined with |)
-    tags: list of tag names to remove (joined with ,)
-    """
-    url = host.rstrip("/") + "/api/v2/torrents/removeTags"
-    data = {
-        "hashes": "|".join(hashes),
-        "tags": ",".join(tags)
-    }
-    r = s.post(url, data=data, timeout=TIMEOUT)
-    r.raise_for_status()
-    return
+BATCH_SIZE = 100
+REMOVE_WORKERS = 8  # lots removeTags envoyés en parallèle (idempotents, ordre indifférent)
 
 # ---------------- helpers ----------------
 def parse_tags(tag_str: Optional[str]) -> List[str]:
@@ -77,30 +51,39 @@ def main(argv=None):
     if args.verbose:
         print(f"[VERB] DRY_RUN={DRY_RUN}", file=sys.stderr)
 
-    s = requests.Session()
+    qb = QbClient(args.host)
     try:
-        qb_login(s, args.host, args.user, args.passw)
+        qb.login(args.user, args.passw)
     except Exception as e:
         print(f"[ERROR] Login failed: {e}", file=sys.stderr)
         return 2
 
     try:
-        all_torrents = qb_get_torrents(s, args.host)
+        # server-side tag filter: only torrents carrying the tag are transferred
+        all_torrents = qb.torrents_by_tag(args.tag.strip())
     except Exception as e:
         print(f"[ERROR] Cannot fetch torrents: {e}", file=sys.stderr)
         return 3
 
     target_tag = args.tag.strip().lower()
-    matches = []
+    hashes = []  # only what removeTags needs
+    names = []   # parallel to hashes, kept only for the --verbose sample
+    keep_names = args.verbose
+    seen = set()  # a hash listed twice by the server is sent (and counted) once
+    # local check kept as a guard: old servers ignore the tag param and return everything
     for t in all_torrents:
-        tags = parse_tags(t.get("tags"))
-        if target_tag in tags:
-            matches.append({"hash": (t.get("hash") or ""), "name": t.get("name"), "tags": tags})
+        if target_tag in parse_tags(t.get("tags")):
+            h = t.get("hash")
+            if h and h not in seen:
+                seen.add(h)
+                hashes.append(h)
+                if keep_names:
+                    names.append(t.get("name"))
 
     # Print number found (as in your other script you printed a single int)
-    print(len(matches))
+    sys.stdout.write(f"{len(hashes)}\n")
 
-    if not matches:
+    if not hashes:
         if args.verbose:
             print("[VERB] No torrents found with that tag.", file=sys.stderr)
         return 0
@@ -108,12 +91,12 @@ def main(argv=None):
     if DRY_RUN:
         # show sample and write plan if wanted
         if args.verbose:
-            for m in matches[:10]:
-                print(f"[VERB] Would remove tag '{target_tag}' from: {m['name']} ({m['hash']})", file=sys.stderr)
-            if len(matches) > 10:
-                print(f"[VERB] ...and {len(matches)-10} more", file=sys.stderr)
+            buf = [f"[VERB] Would remove tag '{target_tag}' from: {name} ({h})\n" for name, h in zip(names[:10], hashes[:10])]
+            if len(hashes) > 10:
+                buf.append(f"[VERB] ...and {len(hashes)-10} more\n")
+            sys.stderr.write("".join(buf))
         else:
-            print(f"[INFO] DRY_RUN: {len(matches)} torrents would have tag '{target_tag}' removed.", file=sys.stderr)
+            print(f"[INFO] DRY_RUN: {len(hashes)} torrents would have tag '{target_tag}' removed.", file=sys.stderr)
         return 0
 
     # APPLY: confirm unless --yes
@@ -121,25 +104,31 @@ def main(argv=None):
         if not sys.stdin.isatty():
             print("[ERROR] Non-interactive shell and --apply used without --yes => abort", file=sys.stderr)
             return 1
-        ans = input(f"[CONFIRM] Remove tag '{target_tag}' from {len(matches)} torrents ? [y/N]: ").strip().lower()
+        ans = input(f"[CONFIRM] Remove tag '{target_tag}' from {len(hashes)} torrents ? [y/N]: ").strip().lower()
         if ans not in ("y","yes","o","oui"):
             print("[INFO] Aborted by user.", file=sys.stderr)
             return 0
 
-    # perform removal in batches (one call is fine for many hashes but keep it modest)
-    BATCH_SIZE = 100
-    hashes = [m["hash"] for m in matches if m["hash"]]
+    # perform removal in batches (one call is fine for many hashes but keep it modest);
+    # batches run concurrently on the client's keep-alive pool
     failures = []
-    for i in range(0, len(hashes), BATCH_SIZE):
-        batch = hashes[i:i+BATCH_SIZE]
-        try:
+    with ThreadPoolExecutor(max_workers=REMOVE_WORKERS) as ex:
+        futs = {}
+        it = iter(hashes)
+        for i in range(0, len(hashes), BATCH_SIZE):
+            batch = tuple(islice(it, BATCH_SIZE))
             if args.verbose:
                 print(f"[ACTION] Removing tag '{target_tag}' from {len(batch)} torrents...", file=sys.stderr)
-            qb_remove_tags(s, args.host, batch, [target_tag])
-        except Exception as e:
-            failures.append({"batch_start": i, "error": str(e)})
-            if args.verbose:
-                print(f"[ERR] removeTags failed for batch starting at {i}: {e}", file=sys.stderr)
+            futs[ex.submit(qb.remove_tags, batch, [target_tag])] = i
+        for f in as_completed(futs):
+            i = futs[f]
+            try:
+                f.result()
+            except Exception as e:
+                failures.append({"batch_start": i, "error": str(e)})
+                if args.verbose:
+                    print(f"[ERR] removeTags failed for batch starting at {i}: {e}", file=sys.stderr)
+    failures.sort(key=lambda x: x["batch_start"])
 
     # report
     if failures:
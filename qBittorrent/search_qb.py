@@ -6,43 +6,77 @@ Amélioration : filtering par state (précis ou friendly), tags, category, name
 Imprime seulement un entier sur stdout (le nombre de torrents correspondants).
 Messages d'info/erreur s'affichent sur stderr si -v/--verbose.
 
-Dépendance: requests
+Dépendance: requests (optionnel : orjson, décodage JSON plus rapide)
 """
 from __future__ import annotations
-import os, sys, re, argparse
-from typing import List, Optional
+import os, sys, re, argparse, hashlib
+from typing import Callable, List, Optional
+from http.cookiejar import LWPCookieJar
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    # orjson (optional) decodes large torrents/info payloads much faster than stdlib json
+    import orjson
+except ImportError:
+    orjson = None
 
 # Defaults from env (modifiable)
 DEFAULT_HOST = os.environ.get('QBT_HOST', 'http://127.0.0.1:8080')
 DEFAULT_USER = os.environ.get('QBT_USER', 'mreclus')
 DEFAULT_PASS = os.environ.get('QBT_PASS', '')
 
+# SID cookie kept between runs (cron), opt-in: next invocations skip the login POST.
+# ex: QBT_COOKIE_FILE=~/.cache/qb_tool/cookies.txt (one file per host/user is derived from it)
+COOKIE_FILE = os.environ.get('QBT_COOKIE_FILE', '')
+
 TIMEOUT = 10.0
+HTTP_POOL_SIZE = 16
+# erreurs transitoires de la WebUI : quelques nouvelles tentatives courtes (CLI lancé en cron)
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.2
 
 # Server-side API filter values (documented)
 API_FILTERS = {
     'all','downloading','seeding','completed','paused','active','inactive',
     'resumed','stalled','stalled_uploading','stalled_downloading','errored'
 }
+_API_FILTERS_HELP = ','.join(sorted(API_FILTERS))
 
-# Map "friendly" status terms -> matcher function or set of candidate state substrings.
+# Map "friendly" status terms -> substrings searched in the lowercased torrent state.
 # The actual torrent['state'] values are like 'StoppedUP','StoppedDL','stalledDL','pausedUP','missingFiles', etc.
 # See qBittorrent docs for exact state names. :contentReference[oaicite:3]{index=3}
-FRIENDLY_STATUS_MAP = {
-    'stopped': lambda s: s and ('stopped' in s.lower() or 'paused' in s.lower()),
-    'paused':  lambda s: s and 'paused' in s.lower(),
-    'stalled': lambda s: s and 'stalled' in s.lower(),
-    'missing': lambda s: s and 'missing' in s.lower(),       # matches missingFiles
-    'checking':lambda s: s and 'checking' in s.lower(),
-    'downloading': lambda s: s and 'downloading' in s.lower(),
-    'uploading': lambda s: s and 'uploading' in s.lower(),
-    'error':   lambda s: s and ('error' in s.lower() or s.lower()=='error'),
+FRIENDLY_SUBSTRINGS = {
+    'stopped': ('stopped', 'paused'),
+    'paused':  ('paused',),
+    'stalled': ('stalled',),
+    'missing': ('missing',),       # matches missingFiles
+    'checking': ('checking',),
+    'downloading': ('downloading',),
+    'uploading': ('uploading',),
+    'error':   ('error',),
     # fallback: exact match handled separately
 }
 
+def json_of(r: requests.Response):
+    return orjson.loads(r.content) if orjson else r.json()
+
+def make_session() -> requests.Session:
+    # une seule connexion keep-alive pour login -> torrents/info
+    s = requests.Session()
+    retry = Retry(total=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR,
+                  status_forcelist=(502, 503, 504),
+                  allowed_methods=frozenset({'GET', 'POST'}))
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    s.mount('http://', adapter)
+    s.mount('https://', adapter)
+    # torrents/info compresse très bien (noms de champs répétés) : réponse gzip demandée
+    s.headers.update({'Accept-Encoding': 'gzip, deflate'})
+    return s
+
 def login(session: requests.Session, base_url: str, user: str, password: str, verify_ssl: bool=True) -> bool:
-    url = base_url.rstrip('/') + '/api/v2/auth/login'
+    url = f'{base_url}/api/v2/auth/login'
     headers = {'Referer': base_url}
     try:
         r = session.post(url, data={'username': user, 'password': password}, headers=headers,
@@ -50,106 +84,154 @@ def login(session: requests.Session, base_url: str, user: str, password: str, ve
     except requests.RequestException as e:
         print(f"[ERR] HTTP login error: {e}", file=sys.stderr)
         return False
-    if r.status_code == 200 and 'SID' in session.cookies.get_dict():
+    if r.status_code == 200 and has_sid(session):
         return True
     # if 200 but no cookie, consider failed
     print(f"[ERR] Login failed (HTTP {r.status_code}).", file=sys.stderr)
     return False
 
-def check_connection(session: requests.Session, base_url: str, verify_ssl: bool=True) -> bool:
-    url = base_url.rstrip('/') + '/api/v2/app/version'
+def has_sid(session: requests.Session) -> bool:
+    # works for the default jar and for the LWPCookieJar loaded from --cookie-file
+    return any(c.name == 'SID' for c in session.cookies)
+
+def cookie_path(base: str, host: str, user: str) -> str:
+    """Per host/user jar next to `base`: another WebUI or account never reads or wipes this SID."""
+    root, ext = os.path.splitext(os.path.expanduser(base))
+    key = hashlib.sha1(f"{host}\n{user}".encode('utf-8')).hexdigest()[:12]
+    return f"{root}-{key}{ext}"
+
+def load_cookies(session: requests.Session, path: str) -> bool:
+    """Attach an on-disk cookie jar to the session; True if it holds a SID from a previous run."""
+    jar = LWPCookieJar(path)
+    session.cookies = jar
     try:
-        r = session.get(url, timeout=TIMEOUT, verify=verify_ssl)
-        return r.status_code == 200 and bool(r.text.strip())
-    except requests.RequestException as e:
-        print(f"[ERR] Connection check failed: {e}", file=sys.stderr)
+        # the SID is a session cookie: without ignore_discard it would never be saved/loaded
+        jar.load(ignore_discard=True)
+    except OSError:
         return False
+    return has_sid(session)
+
+def save_cookies(session: requests.Session) -> None:
+    jar = session.cookies
+    if not isinstance(jar, LWPCookieJar):
+        return
+    try:
+        d = os.path.dirname(jar.filename)
+        if d:
+            os.makedirs(d, mode=0o700, exist_ok=True)
+        old = os.umask(0o077)  # SID = accès WebUI : fichier lisible par l'utilisateur seul
+        try:
+            jar.save(ignore_discard=True)
+        finally:
+            os.umask(old)
+    except OSError as e:
+        print(f"[WARN] Cannot save cookie file {jar.filename}: {e}", file=sys.stderr)
+
+def fetch_tags(session: requests.Session, base_url: str, verify_ssl: bool=True) -> List[str]:
+    url = f'{base_url}/api/v2/torrents/tags'
+    r = session.get(url, timeout=TIMEOUT, verify=verify_ssl)
+    r.raise_for_status()
+    return json_of(r)
 
 def fetch_torrents(session: requests.Session, base_url: str, api_filter: Optional[str]=None,
                    category: Optional[str]=None, tag: Optional[str]=None, verify_ssl: bool=True) -> List[dict]:
     """
-    Call /api/v2/torrents/info. The WebAPI supports filter & category (server side),
-    and some clients/CLI also support tag param. We send filter & category; tag filtering
-    will be done client-side (some endpoints support 'tag' as query param depending on version).
+    Call /api/v2/torrents/info with filter, category and tag applied server side,
+    so only candidate torrents are transferred and decoded.
+    `tag` may be comma-separated (OR): one request per tag, union by hash.
+    The server tag filter is exact (case-sensitive), so the real tag names are
+    resolved first via /torrents/tags. The local matchers still run afterwards:
+    servers that ignore the 'tag' param (< 4.3) just return more torrents.
     """
-    url = base_url.rstrip('/') + '/api/v2/torrents/info'
+    url = f'{base_url}/api/v2/torrents/info'
     params = {}
     if api_filter:
         params['filter'] = api_filter
     if category:
         params['category'] = category
-    # NOTE: older/newer qBittorrent versions may or may not accept 'tag' as query param;
-    # to be portable, we always fetch and filter tags locally. (API docs show tag endpoints exist). :contentReference[oaicite:4]{index=4}
-    r = session.get(url, params=params, timeout=TIMEOUT, verify=verify_ssl)
-    r.raise_for_status()
-    return r.json()
-
-def parse_tags_field(tags_field: Optional[str]) -> List[str]:
-    """
-    qBittorrent returns tags as a string (comma-separated) or empty string;
-    normalize to list of lowercased tag names.
-    """
-    if not tags_field:
-        return []
-    # tags may be like "films,HD", or "films" or ""
-    parts = [p.strip().lower() for p in tags_field.split(',') if p.strip()]
-    return parts
-
-def matches_tag(torrent: dict, tag_query: Optional[str]) -> bool:
-    if not tag_query:
-        return True
-    # accept multiple tags separated by comma in tag_query -> logical OR (match at least one)
-    wanted = [t.strip().lower() for t in tag_query.split(',') if t.strip()]
-    t_tags = parse_tags_field(torrent.get('tags', ''))
-    # match if any wanted tag in torrent tags
-    for w in wanted:
-        if w in t_tags:
-            return True
-    return False
-
-def matches_name(torrent: dict, name_query: Optional[str], use_regex: bool=False) -> bool:
-    if not name_query:
-        return True
-    name = torrent.get('name', '') or ''
-    if use_regex:
+    wanted = {t.strip().lower() for t in tag.split(',') if t.strip()} if tag else set()
+    names = None
+    if wanted:
         try:
-            return re.search(name_query, name, re.IGNORECASE) is not None
-        except re.error:
-            # invalid regex -> fallback substring
-            return name_query.lower() in name.lower()
-    else:
-        return name_query.lower() in name.lower()
+            names = [n for n in fetch_tags(session, base_url, verify_ssl=verify_ssl) if n.lower() in wanted]
+        except (requests.RequestException, ValueError):
+            names = None  # tags endpoint unavailable -> full listing, filtered locally
+    if names is None:
+        r = session.get(url, params=params, timeout=TIMEOUT, verify=verify_ssl)
+        r.raise_for_status()
+        return json_of(r)
+    torrents = {}
+    for name in names:
+        r = session.get(url, params={**params, 'tag': name}, timeout=TIMEOUT, verify=verify_ssl)
+        r.raise_for_status()
+        for t in json_of(r):
+            torrents.setdefault(t.get('hash'), t)
+    return list(torrents.values())
 
-def matches_state(torrent: dict, status_arg: Optional[str]) -> bool:
+def build_predicate(name_query: Optional[str], use_regex: bool, tag_query: Optional[str],
+                    status_arg: Optional[str]) -> Callable[[dict], bool]:
     """
+    Single filter built once per run: regex compiled, queries lowercased, wanted tags
+    parsed and friendly status resolved here, then one call per torrent.
+
+    name: substring (case-insensitive) or regex with use_regex (invalid regex -> substring).
+    tags: comma-separated tag_query -> logical OR (match at least one).
     status_arg handling:
      - if None -> True
      - if in API_FILTERS we assume server filter applied (but to be safe we accept everything here)
      - if equal one of exact states (like 'missingFiles','StoppedUP',...) -> exact compare (case-sensitive typical)
-     - if friendly term (stopped/paused/stalled/...) -> use FRIENDLY_STATUS_MAP match on torrent['state'] (case-insensitive)
+     - if friendly term (stopped/paused/stalled/...) -> use FRIENDLY_SUBSTRINGS match on torrent['state'] (case-insensitive)
     See qBittorrent state names in docs. :contentReference[oaicite:5]{index=5}
     """
-    if not status_arg:
-        return True
-    # If user provided an API filter name, we rely on server-side; but still return True here since server already filtered.
-    if status_arg in API_FILTERS:
-        return True
-    # exact match (allow same-case or different-case)
-    state = torrent.get('state') or ''
-    if state == status_arg or state.lower() == status_arg.lower():
-        return True
-    # friendly synonyms
-    f = FRIENDLY_STATUS_MAP.get(status_arg.lower())
-    if f:
-        return f(state)
-    # fallback: if status_arg looks like 'missingFiles' vs 'missing files' accept both
-    if status_arg.lower().replace(' ', '') == 'missingfiles' and 'missing' in state.lower():
-        return True
-    # if user asked 'stopped' but actual state 'pausedDL' older versions might use paused*, so check that
-    if status_arg.lower() == 'stopped' and ('stopped' in state.lower() or 'paused' in state.lower()):
+    name_search = None
+    name_lc = None
+    if name_query:
+        if use_regex:
+            try:
+                name_search = re.compile(name_query, re.IGNORECASE).search
+            except re.error:
+                # invalid regex -> fallback substring
+                pass
+        if name_search is None:
+            name_lc = name_query.lower()
+
+    wanted = frozenset(t.strip().lower() for t in tag_query.split(',') if t.strip()) if tag_query else None
+
+    # If user provided an API filter name, we rely on server-side (server already filtered).
+    status_lc = None
+    friendly = None
+    missing_files = False
+    if status_arg and status_arg not in API_FILTERS:
+        status_lc = status_arg.lower()
+        # friendly synonyms
+        friendly = FRIENDLY_SUBSTRINGS.get(status_lc)
+        # fallback: if status_arg looks like 'missingFiles' vs 'missing files' accept both
+        missing_files = status_lc.replace(' ', '') == 'missingfiles'
+
+    def pred(torrent: dict) -> bool:
+        if name_search is not None:
+            if name_search(torrent.get('name') or '') is None:
+                return False
+        elif name_lc is not None and name_lc not in (torrent.get('name') or '').lower():
+            return False
+        if wanted is not None:
+            raw = torrent.get('tags')
+            # match if any wanted tag in torrent tags (set lookup, no intermediate list)
+            if not raw or wanted.isdisjoint(p.strip().lower() for p in raw.split(',')):
+                return False
+        if status_lc is not None:
+            # exact match (allow same-case or different-case); state lowercased once
+            state = torrent.get('state') or ''
+            if state == status_arg:
+                return True
+            state_lc = state.lower()
+            if state_lc == status_lc:
+                return True
+            if friendly:
+                return any(sub in state_lc for sub in friendly)
+            return missing_files and 'missing' in state_lc
         return True
-    # no match
-    return False
+    return pred
 
 def parse_args():
     p = argparse.ArgumentParser(description='Compter les torrents qBittorrent selon filtres précis. Imprime uniquement un entier (stdout).')
@@ -160,9 +242,10 @@ def parse_args():
     p.add_argument('-c','--category', help='Category (ex: films)')
     p.add_argument('-t','--tag', help='Tag or comma-separated tags (ex: films,hd). Matches if torrent has at least one.')
     p.add_argument('-s','--status', help=('API filter (server-side) or precise state or friendly term (stopped, paused, stalled, missing, checking, downloading, uploading, error).'
-                                          f' API filters: {",".join(sorted(API_FILTERS))}'))
+                                          f' API filters: {_API_FILTERS_HELP}'))
     p.add_argument('--regex', action='store_true', help='Treat --name as regex (PCRE). If invalid regex, falls back to substring.')
     p.add_argument('--no-verify-ssl', dest='verify_ssl', action='store_false', help='Disable SSL verification (self-signed).')
+    p.add_argument('--cookie-file', default=COOKIE_FILE, help="Cache the SID cookie between runs, one file per host/user derived from this path (env QBT_COOKIE_FILE). Disabled by default.")
     p.add_argument('-v','--verbose', action='store_true', help='Verbose logging to stderr.')
     return p.parse_args()
 
@@ -177,53 +260,81 @@ def main():
         else:
             precise_state = args.status
 
-    s = requests.Session()
-    if args.verbose:
-        print(f"[VERB] Login {args.user}@{args.host} ...", file=sys.stderr)
-    if not login(s, args.host, args.user, args.password, verify_ssl=args.verify_ssl):
-        # print numeric-only 0 on stdout for automation
-        print("0")
+    # base URL cleaned once; helpers expect it without trailing '/'
+    host = args.host.rstrip('/')
+    s = make_session()
+
+    def do_login():
         if args.verbose:
-            print("[VERB] Login failed.", file=sys.stderr)
-        sys.exit(1)
+            print(f"[VERB] Login {args.user}@{args.host} ...", file=sys.stderr)
+        s.cookies.clear()
+        if not login(s, host, args.user, args.password, verify_ssl=args.verify_ssl):
+            # print numeric-only 0 on stdout for automation
+            print("0")
+            if args.verbose:
+                print("[VERB] Login failed.", file=sys.stderr)
+            sys.exit(1)
+        if jar_path:
+            save_cookies(s)
 
-    if args.verbose:
-        print("[VERB] Checking connection (GET /api/v2/app/version)...", file=sys.stderr)
-    if not check_connection(s, args.host, verify_ssl=args.verify_ssl):
-        print("0")
+    # SID cached by a previous run: skip the login POST; an expired one is answered
+    # with 403 and triggers a single fresh login below
+    jar_path = cookie_path(args.cookie_file, host, args.user) if args.cookie_file else None
+    reused = bool(jar_path) and load_cookies(s, jar_path)
+    if reused:
         if args.verbose:
-            print("[VERB] Connection check failed.", file=sys.stderr)
-        sys.exit(2)
+            print(f"[VERB] Reusing cached SID from {jar_path}", file=sys.stderr)
+    else:
+        do_login()
 
-    try:
-        torrents = fetch_torrents(s, args.host, api_filter=api_filter, category=args.category, tag=None, verify_ssl=args.verify_ssl)
-    except Exception as e:
+    # no separate /app/version probe: login validates the SID, and a cached SID that
+    # expired is answered with 403 by torrents/info (the only "expired" signal)
+    while True:
+        try:
+            torrents = fetch_torrents(s, host, api_filter=api_filter, category=args.category,
+                                      tag=args.tag, verify_ssl=args.verify_ssl)
+            break
+        except requests.HTTPError as e:
+            expired = reused and e.response is not None and e.response.status_code == 403
+            if not expired:
+                if args.verbose:
+                    print(f"[ERR] fetch_torrents error: {e}", file=sys.stderr)
+                print("0")
+                sys.exit(3)
+        except Exception as e:
+            if args.verbose:
+                print(f"[ERR] fetch_torrents error: {e}", file=sys.stderr)
+            print("0")
+            sys.exit(3)
         if args.verbose:
-            print(f"[ERR] fetch_torrents error: {e}", file=sys.stderr)
-        print("0")
-        sys.exit(3)
-
-    matched = []
-    for t in torrents:
-        if not matches_name(t, args.name, use_regex=args.regex):
-            continue
-        if not matches_tag(t, args.tag):
-            continue
-        if not matches_state(t, precise_state):
-            continue
-        matched.append(t)
+            print("[VERB] Cached SID rejected, logging in again.", file=sys.stderr)
+        reused = False
+        do_login()
+
+    # one fused filter built once (regex compiled, queries parsed) then applied per torrent
+    pred = build_predicate(args.name, args.regex, args.tag, precise_state)
+    selected = (t for t in torrents if pred(t))
+    total = len(torrents)
+    if args.verbose:
+        # keep only the fields printed below; the full dicts go with `torrents`
+        matched = [(t.get('name'), t.get('state'), t.get('tags')) for t in selected]
+        count = len(matched)
+    else:
+        # automation path: only the count is printed, nothing is kept per torrent
+        count = sum(1 for _ in selected)
+    del torrents
 
     # output only the integer count on stdout
-    print(len(matched))
+    sys.stdout.write(f"{count}\n")
 
-    # verbose: print details to stderr
+    # verbose: details to stderr, built first and written in one go
     if args.verbose:
-        print(f"[VERB] total returned_by_api={len(torrents)} matched_locally={len(matched)}", file=sys.stderr)
-        print(f"[VERB] filters: api_filter={api_filter} precise_state={precise_state} category={args.category} tag={args.tag} name={args.name} regex={args.regex}", file=sys.stderr)
-        for t in matched[:50]:
-            print(f"[VERB] - {t.get('name')} (state={t.get('state')} tags={t.get('tags')})", file=sys.stderr)
-        if len(matched) > 50:
-            print(f"[VERB] ...and {len(matched)-50} more (truncated).", file=sys.stderr)
+        buf = [f"[VERB] total returned_by_api={total} matched_locally={count}\n",
+               f"[VERB] filters: api_filter={api_filter} precise_state={precise_state} category={args.category} tag={args.tag} name={args.name} regex={args.regex}\n"]
+        buf.extend(f"[VERB] - {name} (state={state} tags={tags})\n" for name, state, tags in matched[:50])
+        if count > 50:
+            buf.append(f"[VERB] ...and {count-50} more (truncated).\n")
+        sys.stderr.write(''.join(buf))
 
 if __name__ == '__main__':
     main()